@@ -0,0 +1,65 @@
+"""add asset.next_fire_at with partial ready index
+
+Revision ID: 3f2a9c1d7b40
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d7b40'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    # Databases created by init_db after this change already have the column
+    if "next_fire_at" not in {c["name"] for c in inspector.get_columns("asset")}:
+        op.add_column("asset", sa.Column("next_fire_at", sa.BigInteger(), nullable=True))
+
+    # DUE_DATE wills fire at their due date
+    op.execute(
+        """
+        UPDATE asset
+        SET next_fire_at = triggercondition.value
+        FROM triggercondition
+        WHERE triggercondition.asset_id = asset.id
+          AND triggercondition.condition_type = 'DUE_DATE'
+          AND triggercondition.value IS NOT NULL
+        """
+    )
+    # INACTIVITY wills the cron already found inactive are due now
+    op.execute(
+        """
+        UPDATE asset
+        SET next_fire_at = CAST(EXTRACT(EPOCH FROM now()) AS BIGINT)
+        FROM triggercondition
+        WHERE triggercondition.asset_id = asset.id
+          AND triggercondition.condition_type = 'INACTIVITY'
+          AND asset.is_now_due_date
+          AND asset.next_fire_at IS NULL
+        """
+    )
+
+    if "ix_asset_ready_next_fire_at" not in {i["name"] for i in inspector.get_indexes("asset")}:
+        op.create_index(
+            "ix_asset_ready_next_fire_at",
+            "asset",
+            ["next_fire_at"],
+            postgresql_where=sa.text("validated_funds AND NOT distributed"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_asset_ready_next_fire_at", table_name="asset")
+    op.drop_column("asset", "next_fire_at")
@@ -0,0 +1,57 @@
+"""add lookup indexes for the hot query paths
+
+Revision ID: 8b1e4d6a2c93
+Revises: 3f2a9c1d7b40
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4d6a2c93'
+down_revision: Union[str, None] = '3f2a9c1d7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# name, table, columns
+INDEXES = [
+    # /auth/token and registration look users up by email
+    ("ix_user_email", "user", ["email"]),
+    # return-user-assets, an-asset and asset-supported; owner_id alone uses the leading column
+    ("ix_asset_owner_validated", "asset", ["owner_id", "validated_created", "validated_funds"]),
+    # selectinload(Asset.beneficiaries) / selectinload(Asset.trigger_condition)
+    ("ix_beneficiary_asset_id", "beneficiary", ["asset_id"]),
+    ("ix_triggercondition_asset_id", "triggercondition", ["asset_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and does not
+    # block writes to the table while it builds
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,42 @@
+"""add asset distribution tx tracking
+
+Revision ID: c4d7e2f9a168
+Revises: 8b1e4d6a2c93
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d7e2f9a168'
+down_revision: Union[str, None] = '8b1e4d6a2c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COLUMNS = [
+    sa.Column("distribution_txhash", sa.String(), nullable=True),
+    sa.Column("distribution_nonce", sa.BigInteger(), nullable=True),
+    sa.Column("distribution_reverts", sa.Integer(), nullable=False, server_default="0"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    existing = {c["name"] for c in inspector.get_columns("asset")}
+
+    # Databases created by init_db after this change already have the columns
+    for column in COLUMNS:
+        if column.name not in existing:
+            op.add_column("asset", column)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in reversed(COLUMNS):
+        op.drop_column("asset", column.name)
@@ -0,0 +1,215 @@
+"""
+Micro-benchmarks for the functions every request runs.
+
+Times JWT creation and decoding, validate_email, bcrypt hash and verify at
+the configured cost, the return-user-assets serialization helpers and the
+inactivity score, all offline. Each benchmark reports the median time per
+call over several timeit runs (GC disabled while timing), its spread, CPU
+time per call and, from tracemalloc, the peak and retained memory of a batch
+of calls.
+
+    python benchmarks/bench_hot_paths.py --save-baseline     # on the reference commit
+    python benchmarks/bench_hot_paths.py                     # compare, exit 1 on regressions
+    python benchmarks/bench_hot_paths.py --only jwt_decode serialize_page_50
+
+Baselines live in benchmarks/baselines/hot_paths.json; they are only
+comparable on the same machine and Python version.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Offline defaults, a real .env still wins. The DB_* settings only build the
+# engine at import time, nothing here connects.
+for name, value in {
+    "SECRET_KEY": "benchmark-secret-key",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "cip_bench",
+    "DB_USER": "postgres",
+    "DB_PASSWORD": "postgres",
+}.items():
+    os.environ.setdefault(name, value)
+
+from jose import jwt
+
+# routers.auth prints its settings on import, keep stdout for the JSON report
+with contextlib.redirect_stdout(sys.stderr):
+    from routers.auth import (create_access_token, validate_email, bcrypt_context, _token_digest,
+                              SECRET_KEY, ALGORITHM, BCRYPT_ROUNDS)
+    from routers.process import ASSET_LIST_FIELDS, serialize_asset_row
+    from utils import inactivity_score
+from responses import dumps
+from bench_serialization import build_page, build_rows
+
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "hot_paths.json")
+
+
+def make_benchmarks():
+    """name -> zero-argument callable. Setup happens here, outside the timed calls."""
+    password = "correct horse battery staple"
+    hashed = bcrypt_context.hash(password)
+    page = build_page(50, 3)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    timestamps = [(now - timedelta(days=d)).isoformat().replace("+00:00", "Z") for d in (1, 20, 45, 400)]
+
+    def create_token():
+        coroutine = create_access_token("user@example.com", "0x" + "ab" * 20, 42, timedelta(minutes=30))
+        # Nothing in it awaits, drive it without an event loop round trip
+        try:
+            coroutine.send(None)
+        except StopIteration as done:
+            return done.value
+
+    token = create_token()
+    rows, beneficiaries, triggers = build_rows(50, 3)
+
+    benchmarks = {
+        "jwt_create": create_token,
+        "jwt_decode": lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+        "token_digest": lambda: _token_digest(token),
+        "validate_email": lambda: validate_email("someone.name+tag@example-domain.co.uk"),
+        "serialize_page_50": lambda: [serialize_asset_row(r, ASSET_LIST_FIELDS, beneficiaries, triggers) for r in rows],
+        "render_page_50": lambda: dumps(page),
+        "inactivity_score": lambda: [inactivity_score(ts, now=now) for ts in timestamps],
+        "bcrypt_verify": lambda: bcrypt_context.verify(password, hashed),
+        "bcrypt_hash": lambda: bcrypt_context.hash(password),
+    }
+    return benchmarks
+
+
+def time_calls(func, repeat: int, min_time: float):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    # autorange targets 0.2s, scale to the requested run length
+    number = max(1, int(number * min_time / 0.2))
+
+    cpu_started = time.process_time()
+    runs = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    cpu = (time.process_time() - cpu_started) / (number * repeat)
+    return number, runs, cpu
+
+
+def measure_memory(func, calls: int):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(calls):
+            func()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before, after - before
+
+
+def run_benchmark(func, args):
+    func()  # warm-up, fills caches and lazy imports
+    number, runs, cpu = time_calls(func, args.repeat, args.min_time)
+    median = statistics.median(runs)
+    # Slow benchmarks (bcrypt) trace as many calls as one timing run
+    peak, retained = measure_memory(func, min(args.memory_calls, number))
+    return {
+        "median_us": round(median * 1e6, 3),
+        "min_us": round(min(runs) * 1e6, 3),
+        "rel_stdev": round(statistics.stdev(runs) / median, 4) if len(runs) > 1 and median else 0.0,
+        "cpu_us": round(cpu * 1e6, 3),
+        "calls_per_run": number,
+        "peak_bytes": peak,
+        "retained_bytes": retained,
+    }
+
+
+def compare(current, baseline, args):
+    regressions = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        # The noise of both runs widens the allowed band
+        allowed = args.tolerance + 2 * max(result["rel_stdev"], before["rel_stdev"])
+        if result["median_us"] > before["median_us"] * (1 + allowed):
+            regressions.append({"benchmark": name, "kind": "time",
+                                "baseline_us": before["median_us"], "current_us": result["median_us"]})
+        if result["peak_bytes"] > before["peak_bytes"] * (1 + args.memory_tolerance) + 1024:
+            regressions.append({"benchmark": name, "kind": "peak_memory",
+                                "baseline_bytes": before["peak_bytes"], "current_bytes": result["peak_bytes"]})
+        if result["retained_bytes"] > before["retained_bytes"] + 4096:
+            regressions.append({"benchmark": name, "kind": "retained_memory",
+                                "baseline_bytes": before["retained_bytes"], "current_bytes": result["retained_bytes"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", help="run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=7, help="timing runs per benchmark, the median is kept")
+    parser.add_argument("--min-time", type=float, default=0.2, help="approximate seconds per timing run")
+    parser.add_argument("--memory-calls", type=int, default=100, help="calls traced by tracemalloc")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="allowed relative peak memory growth")
+    args = parser.parse_args()
+
+    benchmarks = make_benchmarks()
+    if args.only:
+        unknown = set(args.only) - set(benchmarks)
+        if unknown:
+            raise SystemExit(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        benchmarks = {name: benchmarks[name] for name in args.only}
+
+    results = {}
+    for name, func in benchmarks.items():
+        results[name] = run_benchmark(func, args)
+        print(f"{name}: {results[name]['median_us']} us", file=sys.stderr)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        },
+        "benchmarks": results,
+    }
+
+    regressions = []
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        report["baseline_saved"] = args.baseline
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != report["environment"]:
+            print("Baseline was recorded in a different environment, timings are not comparable", file=sys.stderr)
+        regressions = compare(results, baseline["benchmarks"], args)
+        report["regressions"] = regressions
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline first", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
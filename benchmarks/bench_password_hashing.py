@@ -0,0 +1,82 @@
+"""
+Throughput benchmark for concurrent password verification.
+
+Runs the same burst of concurrent logins twice: verifying inline on the event
+loop (the old behaviour) and through routers.auth.verify_password (thread
+pool). A heartbeat task measures how long the loop is blocked meanwhile.
+
+    python benchmarks/bench_password_hashing.py --logins 64
+    BCRYPT_ROUNDS=10 PASSWORD_HASH_WORKERS=8 python benchmarks/bench_password_hashing.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routers.auth import bcrypt_context, verify_password, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+
+
+HEARTBEAT_INTERVAL = 0.005
+
+
+async def heartbeat(lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(time.perf_counter() - started - HEARTBEAT_INTERVAL)
+
+
+async def verify_inline(password, hashed):
+    return bcrypt_context.verify(password, hashed)
+
+
+async def burst(verify, logins, password, hashed):
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(HEARTBEAT_INTERVAL * 2)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify(password, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    assert all(results)
+
+    lags.sort()
+    return {
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(logins / elapsed, 1),
+        "loop_lag_p99_ms": round(lags[int(0.99 * (len(lags) - 1))] * 1000, 1) if lags else None,
+        "loop_lag_max_ms": round(lags[-1] * 1000, 1) if lags else None,
+    }
+
+
+async def run(args):
+    password = "correct horse battery staple"
+    hashed = bcrypt_context.hash(password)
+
+    report = {
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "hash_workers": PASSWORD_HASH_WORKERS,
+        "logins": args.logins,
+        "inline": await burst(verify_inline, args.logins, password, hashed),
+        "offloaded": await burst(verify_password, args.logins, password, hashed),
+    }
+    report["speedup"] = round(report["inline"]["seconds"] / report["offloaded"]["seconds"], 2)
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login verifications per burst")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Serialization micro-benchmark on return-user-assets payloads.
+
+Builds listing pages with the same helpers the endpoint uses and times the
+old path (jsonable_encoder + stdlib json, FastAPI's JSONResponse) against
+responses.CIPJSONResponse (orjson), for a few page sizes.
+
+    python benchmarks/bench_serialization.py --pages 10 50 200 --beneficiaries 3
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from collections import namedtuple
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models import AssetTypeEnum, TriggerTypeEnum
+from responses import CIPJSONResponse
+from routers.process import ASSET_LIST_FIELDS, serialize_asset_row, serialize_beneficiary, serialize_trigger
+
+
+AssetRow = namedtuple("AssetRow", ["id", "type", "validated_created", "block_id", "validated_funded"])
+
+
+def build_rows(size: int, beneficiaries_per_asset: int):
+    """Column rows and grouped child dicts, as return-user-assets has them before serializing."""
+    rows = [
+        AssetRow(i, AssetTypeEnum.COTI, True, 1000 + i, i % 2 == 0)
+        for i in range(1, size + 1)
+    ]
+    share = Decimal(100) / beneficiaries_per_asset
+    beneficiaries = {
+        row.id: [serialize_beneficiary(f"0x{row.id:020x}{b:020x}", share) for b in range(beneficiaries_per_asset)]
+        for row in rows
+    }
+    triggers = {row.id: serialize_trigger(TriggerTypeEnum.DUE_DATE, 1_800_000_000 + row.id) for row in rows}
+    return rows, beneficiaries, triggers
+
+
+def build_page(size: int, beneficiaries_per_asset: int):
+    rows, beneficiaries, triggers = build_rows(size, beneficiaries_per_asset)
+    return {
+        "status": "Success",
+        "assets": [serialize_asset_row(row, ASSET_LIST_FIELDS, beneficiaries, triggers) for row in rows],
+        "next_cursor": rows[-1].id,
+    }
+
+
+def render_stdlib(payload):
+    return JSONResponse(content=jsonable_encoder(payload)).body
+
+
+def render_orjson(payload):
+    return CIPJSONResponse(content=payload).body
+
+
+def best_of(func, payload, number: int, repeat: int):
+    return min(timeit.repeat(lambda: func(payload), number=number, repeat=repeat)) / number
+
+
+def run(args):
+    report = {"beneficiaries_per_asset": args.beneficiaries, "pages": {}}
+    for size in args.pages:
+        payload = build_page(size, args.beneficiaries)
+        # Both renderers must produce the same document
+        assert json.loads(render_stdlib(payload)) == json.loads(render_orjson(payload))
+
+        stdlib = best_of(render_stdlib, payload, args.number, args.repeat)
+        fast = best_of(render_orjson, payload, args.number, args.repeat)
+        report["pages"][size] = {
+            "bytes": len(render_orjson(payload)),
+            "stdlib_us": round(stdlib * 1e6, 1),
+            "orjson_us": round(fast * 1e6, 1),
+            "speedup": round(stdlib / fast, 1),
+        }
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200], help="assets per page")
+    parser.add_argument("--beneficiaries", type=int, default=3, help="beneficiaries per asset")
+    parser.add_argument("--number", type=int, default=200, help="renders per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs, best is kept")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
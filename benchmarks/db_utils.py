@@ -0,0 +1,70 @@
+"""
+Shared setup for the database benchmarks (explain_indexes.py,
+generate_dataset.py, query_plans.py).
+
+Import it before anything from the app: models and database read the DB_*
+settings at import time, so they are pointed at BENCH_DATABASE_URL here.
+"""
+import os
+import sys
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import make_url
+from sqlmodel import SQLModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL")
+
+
+def _configure_app_database():
+    if BENCH_DATABASE_URL:
+        url = make_url(BENCH_DATABASE_URL)
+        settings = {
+            "DB_HOST": url.host or "localhost",
+            "DB_PORT": str(url.port or 5432),
+            "DB_NAME": url.database or "",
+            "DB_USER": url.username or "",
+            "DB_PASSWORD": url.password or "",
+        }
+        # The app's engine must never point anywhere else than the benchmark database
+        os.environ.update(settings)
+    else:
+        # Lets --help and the missing URL message work without a .env
+        for name, value in {"DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "cip_bench",
+                            "DB_USER": "postgres", "DB_PASSWORD": ""}.items():
+            os.environ.setdefault(name, value)
+
+
+_configure_app_database()
+
+
+def require_database_url(message="Set BENCH_DATABASE_URL to a throwaway postgresql+asyncpg database"):
+    if not BENCH_DATABASE_URL:
+        raise SystemExit(message)
+    return BENCH_DATABASE_URL
+
+
+def compile_sql(stmt):
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def plan_nodes(plan_json):
+    """Node types of an EXPLAIN (FORMAT JSON) plan with their relation and index, depth first."""
+    nodes = []
+
+    def walk(node):
+        nodes.append(node["Node Type"] + (f" on {node['Relation Name']}" if "Relation Name" in node else "")
+                     + (f" using {node['Index Name']}" if "Index Name" in node else ""))
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan_json[0]["Plan"])
+    return nodes
+
+
+async def recreate_schema(conn):
+    """Drop and recreate every table of the app's metadata."""
+    await conn.run_sync(SQLModel.metadata.drop_all)
+    await conn.run_sync(SQLModel.metadata.create_all)
@@ -4,8 +4,13 @@ from dotenv import load_dotenv
 load_dotenv()
 import aiosqlite
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import exc, event
+from metrics import counter, gauge, histogram, QUERY_BUCKETS
+from db_instrumentation import DB_INSTRUMENT, instrument_engine
+import time
 
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, raiseload, Session as OrmSession
 
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
@@ -22,13 +27,165 @@ connect_arg= {"check_same_thread": False}
 
 DATABASE_URL = (f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
 
-engine = create_async_engine(DATABASE_URL)
+# === CONNECTION POOL ===
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Recycle connections older than this (seconds), -1 keeps them forever
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Prepared statements cached per connection, set 0 behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that records how long checkouts wait for a
+    connection, so the pool can be sized from data.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def create_engine_from_env(url: str = DATABASE_URL, **overrides):
+    """
+    The async engine used by the API and the distribution bot, configured
+    from the DB_POOL_* / DB_STATEMENT_CACHE_SIZE settings.
+    """
+    options = dict(
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={
+            # asyncpg's own cache and SQLAlchemy's adapter cache
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+    options.update(overrides)
+    return create_async_engine(url, **options)
+
+
+engine = create_engine_from_env()
+
+if DB_INSTRUMENT:
+    instrument_engine(engine)
+
+
+# === METRICS ===
+DB_QUERY_DURATION = histogram(
+    "cip_db_query_duration_seconds", "SQL statement execution time", ("operation",), buckets=QUERY_BUCKETS
+)
+DB_QUERY_ERRORS = counter("cip_db_query_errors", "SQL statements that raised", ("operation",))
+DB_POOL_CHECKED_OUT = gauge("cip_db_pool_checked_out", "Connections in use")
+DB_POOL_IDLE = gauge("cip_db_pool_idle", "Idle connections in the pool")
+DB_POOL_OVERFLOW = gauge("cip_db_pool_overflow", "Connections open beyond pool_size")
+DB_POOL_WAIT = gauge("cip_db_pool_checkout_wait_seconds", "Total time checkouts spent waiting for a connection")
+
+
+def statement_operation(statement: str):
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return operation if operation in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _observe_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    DB_QUERY_DURATION.labels(statement_operation(statement)).observe(time.perf_counter() - started)
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _count_query_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+    DB_QUERY_ERRORS.labels(statement_operation(exception_context.statement or "")).inc()
+
+
+def pool_stats(engine=engine):
+    pool = engine.pool
+    stats = {
+        "pool_class": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "timeout_seconds": DB_POOL_TIMEOUT,
+        "recycle_seconds": DB_POOL_RECYCLE,
+        "pre_ping": DB_POOL_PRE_PING,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+    if isinstance(pool, TimedAsyncAdaptedQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "checkout_timeouts": pool.checkout_timeouts,
+            "wait_ms_avg": round(pool.wait_seconds_total / pool.checkouts * 1000, 3) if pool.checkouts else None,
+            "wait_ms_max": round(pool.wait_seconds_max * 1000, 3),
+        })
+    return stats
 
 #engine = create_engine(DB_URL, connect_args=connect_arg, echo=True, future=True)
 #engine = create_engine(DB_URL, connect_args=connect_arg, echo=True, future=True)
 #engine = create_async_engine(DB_URL, echo=True)
 
 
+# === STRICT LOADING ===
+# Raise on any implicit lazy load instead of emitting a hidden query (or
+# MissingGreenlet under the async session). For tests and staging.
+DB_STRICT_LOADING = os.getenv("DB_STRICT_LOADING", "false").lower() in ("1", "true", "yes")
+
+
+def _raise_on_lazy_load(orm_execute_state):
+    # Loader queries (selectinload, deferred columns) run through here too and
+    # must keep their strategy; options named on the statement beat the wildcard
+    if (
+        orm_execute_state.is_select
+        and not orm_execute_state.is_relationship_load
+        and not orm_execute_state.is_column_load
+    ):
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*"))
+
+
+def set_strict_loading(enabled: bool):
+    """Turn strict loading on or off for every session of the process."""
+    installed = event.contains(OrmSession, "do_orm_execute", _raise_on_lazy_load)
+    if enabled and not installed:
+        event.listen(OrmSession, "do_orm_execute", _raise_on_lazy_load)
+    elif not enabled and installed:
+        event.remove(OrmSession, "do_orm_execute", _raise_on_lazy_load)
+
+
+set_strict_loading(DB_STRICT_LOADING)
+
+
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -49,3 +206,9 @@ async def get_db():
 """async def get_db():
     async with AsyncSessionLocal() as session:
         yield session"""
+
+
+DB_POOL_CHECKED_OUT.set_function(lambda: engine.pool.checkedout())
+DB_POOL_IDLE.set_function(lambda: engine.pool.checkedin())
+DB_POOL_OVERFLOW.set_function(lambda: max(engine.pool.overflow(), 0))
+DB_POOL_WAIT.set_function(lambda: getattr(engine.pool, "wait_seconds_total", 0.0))
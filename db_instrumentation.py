@@ -0,0 +1,199 @@
+import os
+import re
+import time
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+# Opt-in: adds two engine listeners and a middleware, meant for staging or
+# for a production instance being investigated
+DB_INSTRUMENT = os.getenv("DB_INSTRUMENT", "false").lower() in ("1", "true", "yes")
+# Statements slower than this are logged with their parameters redacted
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+# Distinct statement shapes kept in the aggregate, later ones are counted as "other"
+DB_FINGERPRINT_LIMIT = int(os.getenv("DB_FINGERPRINT_LIMIT", 500))
+
+
+class RequestQueryStats:
+    __slots__ = ("scope", "count", "seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def route(self):
+        # The router stores the matched route in the scope before the endpoint runs
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(route, 'path', None) or self.scope['path']}"
+
+
+_request_stats: ContextVar[RequestQueryStats | None] = ContextVar("request_query_stats", default=None)
+
+
+def current_request_stats():
+    return _request_stats.get()
+
+
+# === FINGERPRINTS ===
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+# asyncpg placeholders carry casts in multi-row inserts ($1::VARCHAR)
+_PLACEHOLDER = re.compile(r"(?:\$\d+|%\(\w+\)s|(?<![:\w]):\w+|\?)(?:::\w+(?:\[\])?)?")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_LIST = re.compile(r"VALUES\s*\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))*", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str):
+    """
+    Normalized shape of a statement: literals and placeholders become `?`,
+    IN lists and multi-row VALUES collapse, so the same query with different
+    arguments or batch sizes aggregates together.
+    """
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    sql = _VALUES_LIST.sub("VALUES (...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class QueryAggregate:
+    __slots__ = ("count", "seconds", "max_seconds", "routes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.routes = set()
+
+    def add(self, seconds: float, route: str | None):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if route and len(self.routes) < 20:
+            self.routes.add(route)
+
+
+_fingerprints: dict[str, QueryAggregate] = {}
+
+
+def _aggregate(statement: str, seconds: float, route: str | None):
+    key = fingerprint(statement)
+    aggregate = _fingerprints.get(key)
+    if aggregate is None:
+        if len(_fingerprints) >= DB_FINGERPRINT_LIMIT:
+            key = "other"
+            aggregate = _fingerprints.get(key)
+        if aggregate is None:
+            aggregate = _fingerprints[key] = QueryAggregate()
+    aggregate.add(seconds, route)
+
+
+def top_queries(limit: int = 20, order_by: str = "total"):
+    """The heaviest statement shapes by total time, mean time or call count."""
+    sort_keys = {
+        "total": lambda item: item[1].seconds,
+        "mean": lambda item: item[1].seconds / item[1].count,
+        "count": lambda item: item[1].count,
+    }
+    ranked = sorted(_fingerprints.items(), key=sort_keys[order_by], reverse=True)[:limit]
+    return [
+        {
+            "fingerprint": key,
+            "count": aggregate.count,
+            "total_ms": round(aggregate.seconds * 1000, 3),
+            "mean_ms": round(aggregate.seconds / aggregate.count * 1000, 3),
+            "max_ms": round(aggregate.max_seconds * 1000, 3),
+            "routes": sorted(aggregate.routes),
+        }
+        for key, aggregate in ranked
+    ]
+
+
+def reset_queries():
+    _fingerprints.clear()
+
+
+# === SLOW QUERY LOG ===
+def redact(parameters):
+    """Keep the shape of the bound parameters, never their values."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} parameter sets>"
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _on_before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("instrument_started", []).append(time.perf_counter())
+
+
+def _on_after_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["instrument_started"].pop()
+    stats = _request_stats.get()
+    route = None
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+        route = stats.route
+
+    _aggregate(statement, seconds, route)
+
+    if seconds * 1000 >= DB_SLOW_QUERY_MS:
+        print(
+            f"Slow query {seconds * 1000:.1f} ms [{route or 'background'}]: "
+            f"{_WHITESPACE.sub(' ', statement).strip()} params={redact(parameters)}",
+            flush=True,
+        )
+
+
+def _on_error(exception_context):
+    started = exception_context.connection.info.get("instrument_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Attach the query accounting listeners to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _on_before_execute)
+    event.listen(sync_engine, "after_cursor_execute", _on_after_execute)
+    event.listen(sync_engine, "handle_error", _on_error)
+
+
+class QueryStatsMiddleware:
+    """
+    Pure ASGI middleware giving each request its own query counter. The
+    totals go out as X-DB-Query-Count and X-DB-Time-Ms response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats(scope)
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
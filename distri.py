@@ -1,64 +1,67 @@
-from web3 import Web3
-import time
+from web3 import AsyncWeb3, Web3
+from web3.exceptions import TransactionNotFound
+import asyncio
+import signal
 import json
 from sqlmodel import select, or_, and_
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import selectinload
 from models import User, Asset, TriggerCondition, TriggerTypeEnum
-from sqlmodel import SQLModel, Field, Session, select, create_engine
+from database import AsyncSessionLocal, engine
 from decimal import Decimal
+from scheduler import trigger_scheduler
+from metrics import counter, gauge, histogram
 import time
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-
 
-DATABASE_URL = (
-    f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
-#DATABASE_URL=os.getenv('DATABASE_URL_BOT')
+def ready_assets_statement(now, asset_ids=None):
+    """
+    Funded, undistributed assets whose next_fire_at has passed. The predicate
+    matches ix_asset_ready_next_fire_at, so this is one index range scan.
+    """
+    stmt = (
+        select(Asset)
+        .where(Asset.validated_funds == True)
+        .where(Asset.distributed == False)
+        .where(Asset.next_fire_at <= now)
+        .options(selectinload(Asset.trigger_condition))
+    )
+    if asset_ids is not None:
+        stmt = stmt.where(Asset.id.in_(asset_ids))
+    return stmt
 
-engine = create_engine(DATABASE_URL)
 
-def get_ready_assets():
-    with Session(engine) as session:
+async def get_ready_assets(asset_ids=None):
+    """
+    Funded, undistributed assets whose trigger has fired. `asset_ids` narrows
+    the check to the assets the scheduler reports as due.
+    """
+    async with AsyncSessionLocal() as session:
         now = int(time.time())  # UNIX timestamp
+        result = await session.execute(ready_assets_statement(now, asset_ids))
+        return result.scalars().all()
+
+
+async def load_deadlines():
+    """
+    (asset_id, next_fire_at) for every funded, undistributed asset with a
+    known fire time, read from the partial index without building entities.
+    """
+    async with AsyncSessionLocal() as session:
         stmt = (
-    select(Asset)
-    .where(Asset.validated_funds == True)
-    .where(Asset.distributed == False)
-    .where(Asset.trigger_condition != None)
-    .where(
-        or_(
-            and_(
-                Asset.trigger_condition.has(
-                    and_(
-                        TriggerCondition.condition_type == TriggerTypeEnum.DUE_DATE,
-                        TriggerCondition.value <= now
-                    )
-                )
-            ),
-            and_(
-                Asset.trigger_condition.has(
-                    TriggerCondition.condition_type == TriggerTypeEnum.INACTIVITY
-                ),
-                Asset.is_now_due_date == True
-            )
+            select(Asset.id, Asset.next_fire_at)
+            .where(Asset.validated_funds == True)
+            .where(Asset.distributed == False)
+            .where(Asset.next_fire_at != None)
         )
-    )
-    .options(selectinload(Asset.trigger_condition))
-    )
-        
-        return session.exec(stmt).all()
+        result = await session.execute(stmt)
+        return [(asset_id, next_fire_at) for asset_id, next_fire_at in result.all()]
 
 # === CONFIGURATION ===
-RPC_URL = "https://mainnet.coti.io/rpc"
+RPC_URL = os.getenv("COTI_RPC", "https://mainnet.coti.io/rpc")
 CONTRACT_ADDRESS = Web3.to_checksum_address("0x5Bbe88FD68C97a745fFD76809DE5A8708B867d14")
 
 # Load your wallet's private key and address
@@ -70,21 +73,245 @@ NEW = "0x1014BD7f50abb2A3107EC701701fb93542912e3a"
 with open("WalletDistributor.abi.json") as f:
     CONTRACT_ABI = json.load(f)
 
-# === INIT WEB3 ===
-web3 = Web3(Web3.HTTPProvider(RPC_URL))
-assert web3.is_connected(), "Failed to connect to RPC"
+# === SUBMISSION SETTINGS ===
+# Number of distribute transactions sent back to back before waiting for receipts
+DISTRIBUTION_WINDOW = int(os.getenv("DISTRIBUTION_WINDOW", 10))
+RECEIPT_TIMEOUT = int(os.getenv("RECEIPT_TIMEOUT", 120))
+DISTRIBUTION_GAS_LIMIT = 300_000
+
+NONCE_ERRORS = ("nonce too low", "already known", "replacement transaction underpriced", "invalid nonce")
+
+# === BOT LOOP SETTINGS ===
+# Full reload of the deadline heap, a safety net for changes made by other processes.
+# A standalone worker gets no in-process notifications, so give it a shorter interval.
+SCHEDULER_RESYNC_SECONDS = int(os.getenv("SCHEDULER_RESYNC_SECONDS", 3600))
+# Delay before an asset whose distribution did not confirm is checked again
+DISTRIBUTION_RETRY_SECONDS = int(os.getenv("DISTRIBUTION_RETRY_SECONDS", 300))
+# Reverted distributions back off from DISTRIBUTION_RETRY_SECONDS, doubling up to
+# DISTRIBUTION_REVERT_BACKOFF_MAX; after DISTRIBUTION_MAX_REVERTS the asset is left alone
+DISTRIBUTION_REVERT_BACKOFF_MAX = int(os.getenv("DISTRIBUTION_REVERT_BACKOFF_MAX", 86400))
+DISTRIBUTION_MAX_REVERTS = int(os.getenv("DISTRIBUTION_MAX_REVERTS", 5))
+# How long shutdown waits for an in-flight window before cancelling it. Never less than
+# RECEIPT_TIMEOUT: a window cancelled after sending is not marked and is rechecked on restart.
+BOT_SHUTDOWN_TIMEOUT = max(float(os.getenv("BOT_SHUTDOWN_TIMEOUT", RECEIPT_TIMEOUT + 30)), RECEIPT_TIMEOUT + 5)
+
+
+# === METRICS ===
+BOT_LOOP_DURATION = histogram("cip_bot_loop_duration_seconds", "Time of one bot iteration that had due assets")
+BOT_READY_ASSETS = gauge("cip_bot_ready_assets", "Assets found ready in the last bot iteration")
+BOT_SCHEDULED_TRIGGERS = gauge("cip_bot_scheduled_triggers", "Trigger deadlines held by the scheduler")
+BOT_DISTRIBUTIONS = counter("cip_bot_distributions", "Distribution transactions by result", ("result",))
+BOT_GAS_USED = counter("cip_bot_gas_used", "Gas used by mined distribution transactions")
+BOT_FEES_WEI = counter("cip_bot_fees_wei", "Fees paid for mined distribution transactions, in wei")
+BOT_RECEIPT_WAIT = histogram(
+    "cip_bot_receipt_wait_seconds", "Time from sending a distribution to its receipt",
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+BOT_SCHEDULED_TRIGGERS.set_function(lambda: len(trigger_scheduler))
+
+
+class NonceManager:
+    """
+    Hands out nonces locally so several transactions can be in flight at once.
+    The counter is resynced from the node's pending count after any gap
+    (dropped transaction, nonce-too-low), which also refills a hole left by a
+    dropped transaction with the next submission.
+    """
+
+    def __init__(self, web3, address):
+        self.web3 = web3
+        self.address = address
+        self._lock = asyncio.Lock()
+        self._next = None
+
+    async def sync(self):
+        async with self._lock:
+            self._next = await self.web3.eth.get_transaction_count(self.address, "pending")
+            return self._next
+
+    async def allocate(self):
+        async with self._lock:
+            if self._next is None:
+                self._next = await self.web3.eth.get_transaction_count(self.address, "pending")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def reset(self):
+        self._next = None
+
+
+def is_nonce_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in NONCE_ERRORS)
+
+
+def record_gas(receipt, gas_price):
+    gas_used = receipt.get("gasUsed", 0)
+    BOT_GAS_USED.inc(gas_used)
+    BOT_FEES_WEI.inc(gas_used * receipt.get("effectiveGasPrice", gas_price))
+
+
+async def mark_distributed(asset_id):
+    async with AsyncSessionLocal() as session:
+        db_asset = await session.get(Asset, asset_id)
+        if db_asset:
+            db_asset.distributed = True
+            session.add(db_asset)
+            await session.commit()
+            print(f"📌 Asset {asset_id} marked as distributed ✅")
+
+
+async def record_pending_distribution(asset_id, tx_hash, nonce):
+    """Remember the distribution just sent, before waiting for it to be mined."""
+    async with AsyncSessionLocal() as session:
+        db_asset = await session.get(Asset, asset_id)
+        if db_asset:
+            db_asset.distribution_txhash = Web3.to_hex(tx_hash)
+            db_asset.distribution_nonce = nonce
+            session.add(db_asset)
+            await session.commit()
+
+
+def revert_backoff(reverts: int):
+    return min(DISTRIBUTION_RETRY_SECONDS * 2 ** max(reverts - 1, 0), DISTRIBUTION_REVERT_BACKOFF_MAX)
+
 
-# === INIT CONTRACT ===
-contract = web3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+async def record_reverted_distribution(asset_id):
+    """
+    Count a reverted distribution and push next_fire_at back by the backoff,
+    so it holds across resyncs and restarts. Returns the new fire time, or
+    None once DISTRIBUTION_MAX_REVERTS is reached and the asset is dropped
+    from the schedule.
+    """
+    async with AsyncSessionLocal() as session:
+        db_asset = await session.get(Asset, asset_id)
+        if not db_asset:
+            return None
+        db_asset.distribution_txhash = None
+        db_asset.distribution_nonce = None
+        db_asset.distribution_reverts = (db_asset.distribution_reverts or 0) + 1
+        if db_asset.distribution_reverts >= DISTRIBUTION_MAX_REVERTS:
+            db_asset.next_fire_at = None
+            print(f"🚫 Asset {asset_id} reverted {db_asset.distribution_reverts} times, not retried")
+        else:
+            db_asset.next_fire_at = int(time.time() + revert_backoff(db_asset.distribution_reverts))
+        session.add(db_asset)
+        await session.commit()
+        return db_asset.next_fire_at
 
-# === BOT LOOP ===
-def main():
-    print("🚀 Starting COTI Will Bot…")
-    while True:
+
+class DistributionBot:
+    """
+    The COTI will bot as an asyncio task. It runs under the FastAPI lifespan
+    or on its own (`python distri.py`) with the same code.
+    """
+
+    def __init__(self, rpc_url=RPC_URL):
+        self.web3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(rpc_url))
+        self.contract = self.web3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+        self.nonce_manager = NonceManager(self.web3, MY_ADDRESS)
+        self._stopping = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._stopping.clear()
+        self._task = asyncio.create_task(self.run(), name="distribution-bot")
+        return self._task
+
+    async def stop(self, timeout=BOT_SHUTDOWN_TIMEOUT):
+        """
+        Stop sending, then let the receipts of distributions already sent
+        drain so they are marked distributed before the bot exits.
+        """
+        self._stopping.set()
+        trigger_scheduler.wake()
+        if self._task is None:
+            return
         try:
-            assets = get_ready_assets()
-            print(f"🔍 Found {len(assets)} validated assets to process.")
-            for asset in assets:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            print("⚠️ Bot did not stop in time, cancelling")
+        except Exception as e:
+            print(f"⚠️ Bot stopped with error: {e}")
+        self._task = None
+        await self.web3.provider.disconnect()
+
+    async def run(self):
+        print("🚀 Starting COTI Will Bot…")
+        if not await self.web3.is_connected():
+            print("⚠️ Failed to connect to RPC, will keep retrying")
+
+        last_resync = 0.0
+        while not self._stopping.is_set():
+            try:
+                if time.time() - last_resync >= SCHEDULER_RESYNC_SECONDS:
+                    trigger_scheduler.load(await load_deadlines())
+                    last_resync = time.time()
+                    print(f"🗓️ Scheduler loaded {len(trigger_scheduler)} upcoming triggers.")
+
+                due_ids = trigger_scheduler.pop_due()
+                if due_ids:
+                    with BOT_LOOP_DURATION.time():
+                        assets = await get_ready_assets(due_ids)
+                        BOT_READY_ASSETS.set(len(assets))
+                        print(f"🔍 Found {len(assets)} validated assets to process.")
+                        settled = await self.distribute_assets(assets)
+
+                    retry_at = time.time() + DISTRIBUTION_RETRY_SECONDS
+                    for asset in assets:
+                        if asset.id not in settled:
+                            trigger_scheduler.schedule(asset.id, retry_at)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Error: {e}")
+
+            if self._stopping.is_set():
+                break
+            await trigger_scheduler.wait(max(0.0, last_resync + SCHEDULER_RESYNC_SECONDS - time.time()))
+
+        print("🛑 COTI Will Bot stopped")
+
+    async def distribute_assets(self, assets, window=DISTRIBUTION_WINDOW):
+        """
+        Pipeline the distributions: send up to `window` transactions back to back
+        with locally allocated nonces, then wait for their receipts concurrently.
+        Each asset is marked distributed as soon as its own receipt confirms.
+        Once the bot is stopping nothing new is sent, but the receipts of the
+        transactions already sent are still awaited.
+
+        An asset with a distribution already sent is only sent again once that
+        transaction can no longer be mined (see check_pending).
+
+        Returns the ids of the assets settled here: distributed, or reverted
+        and rescheduled after their backoff. The caller retries the others.
+        """
+        settled = set()
+        window = max(1, window)
+        for start in range(0, len(assets), window):
+            if self._stopping.is_set():
+                break
+            batch = assets[start:start + window]
+            gas_price = int(await self.web3.eth.gas_price * 1.1)
+
+            checks = await asyncio.gather(*(self.check_pending(asset) for asset in batch))
+
+            sent = []
+            for asset, (state, receipt) in zip(batch, checks):
+                if self._stopping.is_set():
+                    break
+                if state == "mined":
+                    record_gas(receipt, gas_price)
+                    if await self.settle_receipt(asset, receipt):
+                        settled.add(asset.id)
+                    continue
+                if state == "pending":
+                    print(f"⏳ Distribution {asset.distribution_txhash} for asset {asset.id} still pending")
+                    continue
+                # A dropped transaction is replaced on its own nonce, so at most one of them is mined
+                nonce = asset.distribution_nonce if state == "dropped" else None
                 owner = Web3.to_checksum_address(asset.wallet_address)
                 will_id = asset.blockchain_user_will_id
                 inactivity_months = int(asset.trigger_condition.value or 0)
@@ -94,57 +321,149 @@ def main():
                     f"observedInactivity: {inactivity_months} months"
                 )
 
-                success, tx_hash, block_number = trigger_distribution(
-                    owner, will_id, inactivity_months
-                )
+                try:
+                    tx_hash, nonce = await self.send_distribution(owner, will_id, inactivity_months, gas_price,
+                                                                  nonce=nonce)
+                except Exception as e:
+                    print(f"❌ Could not send distribution for asset {asset.id}: {e}")
+                    BOT_DISTRIBUTIONS.labels("send_failed").inc()
+                    continue
+                sent.append((asset, tx_hash, time.perf_counter()))
+                try:
+                    await record_pending_distribution(asset.id, tx_hash, nonce)
+                except Exception as e:
+                    print(f"⚠️ Could not record distribution {tx_hash.hex()} for asset {asset.id}: {e}")
+
+            async def wait_receipt(asset, tx_hash, sent_at):
+                try:
+                    receipt = await self.web3.eth.wait_for_transaction_receipt(tx_hash, RECEIPT_TIMEOUT)
+                except Exception as e:
+                    return asset, tx_hash, None, e
+                BOT_RECEIPT_WAIT.observe(time.perf_counter() - sent_at)
+                return asset, tx_hash, receipt, None
+
+            for next_receipt in asyncio.as_completed([wait_receipt(*entry) for entry in sent]):
+                asset, tx_hash, receipt, error = await next_receipt
+                if error is not None:
+                    # Still pending or dropped: the stored hash and nonce are checked before any resend
+                    print(f"⌛ No receipt for {tx_hash.hex()} (asset {asset.id}): {error}")
+                    BOT_DISTRIBUTIONS.labels("no_receipt").inc()
+                    self.nonce_manager.reset()
+                    continue
 
-                if success:
-                    with Session(engine) as session:
-                        db_asset = session.get(Asset, asset.id)
-                        if db_asset:
-                            db_asset.distributed = True
-                            session.add(db_asset)
-                            session.commit()
-                            print(f"📌 Asset {asset.id} marked as distributed ✅")
-                else:
-                    print(f"❌ Transaction failed for asset {asset.id}")
+                print(f"⛏️ Mined in block {receipt.blockNumber}")
+                record_gas(receipt, gas_price)
+                if await self.settle_receipt(asset, receipt):
+                    settled.add(asset.id)
+
+        return settled
+
+    async def check_pending(self, asset):
+        """
+        State of the distribution last sent for `asset`, with its receipt when mined:
+        "none" (nothing sent), "mined", "pending" (still known to the node),
+        "dropped" (unknown, its nonce still free) or "replaced" (its nonce was used
+        by another transaction, so it can never be mined).
+        """
+        if not asset.distribution_txhash:
+            return "none", None
+
+        # Read the confirmed nonce first: a receipt missing after it is final
+        confirmed_nonce = await self.web3.eth.get_transaction_count(MY_ADDRESS, "latest")
+        try:
+            return "mined", await self.web3.eth.get_transaction_receipt(asset.distribution_txhash)
+        except TransactionNotFound:
+            pass
 
+        if asset.distribution_nonce is None or confirmed_nonce > asset.distribution_nonce:
+            return "replaced", None
+        try:
+            await self.web3.eth.get_transaction(asset.distribution_txhash)
+            return "pending", None
+        except TransactionNotFound:
+            return "dropped", None
+
+    async def settle_receipt(self, asset, receipt):
+        """Mark a mined distribution; True when the asset needs no retry from the caller."""
+        if receipt.status == 1:
+            await mark_distributed(asset.id)
+            BOT_DISTRIBUTIONS.labels("distributed").inc()
+            return True
+
+        print(f"❌ Transaction failed for asset {asset.id}")
+        BOT_DISTRIBUTIONS.labels("reverted").inc()
+        next_fire_at = await record_reverted_distribution(asset.id)
+        if next_fire_at is None:
+            trigger_scheduler.cancel(asset.id)
+        else:
+            trigger_scheduler.schedule(asset.id, next_fire_at)
+        return True
+
+    async def send_distribution(self, owner: str, will_id: int, observed_inactivity_months: int, gas_price: int,
+                                retries: int = 1, nonce: int | None = None):
+        """
+        Sign and broadcast one distribute call without waiting for it to be mined.
+        `nonce` replaces a dropped transaction on its own nonce, it is never
+        swapped for another one. Returns the transaction hash and its nonce.
+        """
+        fixed_nonce = nonce is not None
+        if not fixed_nonce:
+            nonce = await self.nonce_manager.allocate()
+
+        tx = await self.contract.functions.distribute(
+            owner,
+            will_id,
+            observed_inactivity_months
+        ).build_transaction({
+            "from": MY_ADDRESS,
+            "nonce": nonce,
+            "gas": DISTRIBUTION_GAS_LIMIT,
+            "gasPrice": gas_price
+        })
+
+        signed_tx = self.web3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
+        try:
+            tx_hash = await self.web3.eth.send_raw_transaction(signed_tx.raw_transaction)
         except Exception as e:
-            print(f"⚠️ Error: {e}")
+            if is_nonce_error(e) and retries > 0 and not fixed_nonce:
+                print(f"🔁 Nonce {nonce} rejected ({e}), resyncing")
+                await self.nonce_manager.sync()
+                return await self.send_distribution(owner, will_id, observed_inactivity_months, gas_price, retries - 1)
+            self.nonce_manager.reset()
+            raise
 
-        time.sleep(3600)  # run every  1Hr
+        print(f"✅ Tx sent: {tx_hash.hex()} (nonce {nonce})")
+        return tx_hash, nonce
 
+    async def trigger_distribution(self, owner: str, will_id: int, observed_inactivity_months: int):
+        gas_price = int(await self.web3.eth.gas_price * 1.1)
+        tx_hash, _ = await self.send_distribution(owner, will_id, observed_inactivity_months, gas_price)
 
+        receipt = await self.web3.eth.wait_for_transaction_receipt(tx_hash, RECEIPT_TIMEOUT)
+        print(f"⛏️ Mined in block {receipt.blockNumber}")
+        record_gas(receipt, gas_price)
 
+        if receipt.status == 1:
+            return True, tx_hash.hex(), receipt.blockNumber
+        else:
+            return False, tx_hash.hex(), receipt.blockNumber
 
-def trigger_distribution(owner: str, will_id: int, observed_inactivity_months: int):
-    nonce = web3.eth.get_transaction_count(MY_ADDRESS, "pending")
-    gas_price = int(web3.eth.gas_price * 1.1)
 
-    tx = contract.functions.distribute(
-        owner,
-        will_id,
-        observed_inactivity_months
-    ).build_transaction({
-        "from": MY_ADDRESS,
-        "nonce": nonce,
-        "gas": 300_000,
-        "gasPrice": gas_price
-    })
+async def main():
+    """Run the bot as a standalone worker process until SIGINT/SIGTERM."""
+    bot = DistributionBot()
+    bot.start()
 
-    signed_tx = web3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    print(f"✅ Tx sent: {tx_hash.hex()}")
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_requested.set)
 
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-    print(f"⛏️ Mined in block {receipt.blockNumber}")
+    await stop_requested.wait()
+    await bot.stop()
+    await engine.dispose()
 
-    if receipt.status == 1:
-        return True, tx_hash.hex(), receipt.blockNumber
-    else:
-        return False, tx_hash.hex(), receipt.blockNumber
 
-    
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,53 +1,444 @@
 from models import *
-from sqlalchemy import event
+from sqlalchemy import event, update, insert, func, and_, or_
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
-from database import get_db
-from utils import get_important_tx_details
+from database import get_db, AsyncSessionLocal
+from utils import (get_important_tx_details, get_rpc_tx_details, will_event_details, event_topic,
+                   RPC_BATCH_SIZE)
+from collections import deque, Counter
+from datetime import datetime, timezone, timedelta
+from enum import Enum
+from dotenv import load_dotenv
+from scheduler import trigger_scheduler
+from metrics import counter, histogram
 import asyncio
+import os
 
+load_dotenv()
 
 
 db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", 4))
+VALIDATION_POLL_INTERVAL = float(os.getenv("VALIDATION_POLL_INTERVAL", 1.0))
+VALIDATION_MAX_ATTEMPTS = int(os.getenv("VALIDATION_MAX_ATTEMPTS", 8))
+VALIDATION_BACKOFF_BASE = float(os.getenv("VALIDATION_BACKOFF_BASE", 5.0))
+VALIDATION_BACKOFF_MAX = float(os.getenv("VALIDATION_BACKOFF_MAX", 600.0))
+# "explorer" resolves one hash per cotiscan call, "rpc" batches receipt lookups
+VALIDATION_BACKEND = os.getenv("VALIDATION_BACKEND", "explorer").lower()
+# Required by the rpc backend, which only accepts a receipt carrying the will contract's
+# creation / funding event for the asset's will. The event signatures (e.g.
+# "WillFunded(address,uint256,uint256)") must index the owner then the will id, the funded
+# amount is the first data word. There are no defaults: WalletDistributor.abi.json
+# declares neither event, so they have to come from the deployed contract.
+WILL_CONTRACT_ADDRESS = os.getenv("WILL_CONTRACT_ADDRESS")
+WILL_CREATED_EVENT = os.getenv("WILL_CREATED_EVENT")
+WILL_FUNDED_EVENT = os.getenv("WILL_FUNDED_EVENT")
+# A running job not finished within the lease is assumed lost (e.g. restart)
+VALIDATION_JOB_LEASE = float(os.getenv("VALIDATION_JOB_LEASE", 300.0))
 
-async def validate_asset_created_async(txhash: str, session: AsyncSession):
-    await asyncio.sleep(5)  # wait for 4 seconds
+# Delay before the first attempt, a fresh transaction is rarely indexed yet
+INITIAL_DELAY = {
+    ValidationJobKindEnum.ASSET_CREATED: 5,
+    ValidationJobKindEnum.ASSET_FUNDED: 20,
+}
+
+
+class ValidationOutcome(str, Enum):
+    VALIDATED = "validated"
+    RETRY = "retry"          # not mined / not indexed yet
+    UNMATCHED = "unmatched"  # mined, but no matching will event (yet), retried like RETRY
+    FAILED = "failed"        # transaction reverted
+    MISSING = "missing"      # no asset with that txhash
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def mark_asset_created(session: AsyncSession, txhash: str, info: dict, will_event: str | None = None):
+    """`will_event`, when given, is the event topic the receipt logs must carry for this asset."""
     result = await session.execute(select(Asset).where(Asset.txhash == txhash))
     asset = result.scalar_one_or_none()
-    info = await get_important_tx_details(txhash=txhash)
+    if not asset:
+        print("No asset found with that txhash.")
+        return ValidationOutcome.MISSING
 
+    if will_event is not None:
+        info = will_event_details(info, WILL_CONTRACT_ADDRESS, will_event,
+                                  asset.wallet_address, asset.blockchain_user_will_id)
+
+    if info.get("status") is None:
+        return ValidationOutcome.RETRY
+    if info.get("status") == "unmatched":
+        return ValidationOutcome.UNMATCHED
     if not info.get("status") == "ok":
-            return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Transaction Failed")
-    if asset:
-        asset.validated_created = True
-        session.add(asset)
-        await session.commit()
-        await session.refresh(asset)
-        print(f"Asset {asset.id} validated.")
-    else:
-        print("No asset found with that txhash.")
+        return ValidationOutcome.FAILED
 
+    asset.validated_created = True
+    session.add(asset)
+    await session.commit()
+    print(f"Asset {asset.id} validated.")
+    return ValidationOutcome.VALIDATED
 
-async def validate_asset_funded_async(txhash: str, session: AsyncSession):
-    await asyncio.sleep(20)  # wait for 4 seconds
+
+async def mark_asset_funded(session: AsyncSession, txhash: str, info: dict, will_event: str | None = None):
     result = await session.execute(select(Asset).where(Asset.txhash_funded == txhash))
     asset = result.scalar_one_or_none()
-    info = await get_important_tx_details(txhash=txhash)
+    if not asset:
+        print("No asset found with that txhash.")
+        return ValidationOutcome.MISSING
+
+    if will_event is not None:
+        info = will_event_details(info, WILL_CONTRACT_ADDRESS, will_event,
+                                  asset.wallet_address, asset.blockchain_user_will_id)
 
+    if info.get("status") is None:
+        return ValidationOutcome.RETRY
+    if info.get("status") == "unmatched":
+        return ValidationOutcome.UNMATCHED
     if not info.get("status") == "ok":
-         return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Transaction Failed")
-    if asset:
-        asset.validated_funds = True
-        asset.balance = info.get("value_sent")
-        session.add(asset)
+        return ValidationOutcome.FAILED
+
+    asset.validated_funds = True
+    asset.balance = info.get("value_sent")
+    session.add(asset)
+    await session.commit()
+    print(f"Asset {asset.id} validated.")
+
+    if asset.next_fire_at is not None:
+        trigger_scheduler.schedule(asset.id, asset.next_fire_at)
+    return ValidationOutcome.VALIDATED
+
+
+async def validate_asset_created_async(txhash: str, session: AsyncSession):
+    info = await get_important_tx_details(txhash=txhash)
+    return await mark_asset_created(session, txhash, info)
+
+
+async def validate_asset_funded_async(txhash: str, session: AsyncSession):
+    info = await get_important_tx_details(txhash=txhash)
+    return await mark_asset_funded(session, txhash, info)
+
+
+VALIDATORS = {
+    ValidationJobKindEnum.ASSET_CREATED: validate_asset_created_async,
+    ValidationJobKindEnum.ASSET_FUNDED: validate_asset_funded_async,
+}
+
+MARKERS = {
+    ValidationJobKindEnum.ASSET_CREATED: mark_asset_created,
+    ValidationJobKindEnum.ASSET_FUNDED: mark_asset_funded,
+}
+
+WILL_EVENTS = {
+    kind: event_topic(signature)
+    for kind, signature in (
+        (ValidationJobKindEnum.ASSET_CREATED, WILL_CREATED_EVENT),
+        (ValidationJobKindEnum.ASSET_FUNDED, WILL_FUNDED_EVENT),
+    )
+    if signature
+}
+
+
+def missing_rpc_settings():
+    """Settings the rpc backend cannot run without."""
+    return [
+        name for name, value in (
+            ("WILL_CONTRACT_ADDRESS", WILL_CONTRACT_ADDRESS),
+            ("WILL_CREATED_EVENT", WILL_CREATED_EVENT),
+            ("WILL_FUNDED_EVENT", WILL_FUNDED_EVENT),
+        )
+        if not value
+    ]
+
+
+async def enqueue_validation(session: AsyncSession, kind: ValidationJobKindEnum, txhash: str):
+    """
+    Add a validation job to `session`. It is committed with the caller's
+    transaction, so the job exists exactly when the asset change does.
+    """
+    job = ValidationJob(
+        kind=kind,
+        txhash=txhash,
+        max_attempts=VALIDATION_MAX_ATTEMPTS,
+        run_at=_utcnow() + timedelta(seconds=INITIAL_DELAY[kind]),
+    )
+    session.add(job)
+    return job
+
+
+async def enqueue_validations(session: AsyncSession, kind: ValidationJobKindEnum, txhashes):
+    """Set-based `enqueue_validation` for many transactions, one INSERT statement."""
+    txhashes = list(txhashes)
+    if not txhashes:
+        return
+    run_at = _utcnow() + timedelta(seconds=INITIAL_DELAY[kind])
+    created_at = _utcnow()
+    await session.execute(
+        insert(ValidationJob),
+        [
+            {
+                "kind": kind,
+                "txhash": txhash,
+                "status": ValidationJobStatusEnum.PENDING,
+                "attempts": 0,
+                "max_attempts": VALIDATION_MAX_ATTEMPTS,
+                "run_at": run_at,
+                "created_at": created_at,
+            }
+            for txhash in txhashes
+        ],
+    )
+
+
+def backoff_delay(attempts: int):
+    return min(VALIDATION_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), VALIDATION_BACKOFF_MAX)
+
+
+async def claim_due_jobs(limit: int = 1):
+    """
+    Atomically move up to `limit` due jobs to RUNNING. SKIP LOCKED lets several
+    workers (and several processes) poll the table without blocking each other.
+    """
+    now = _utcnow()
+    due_jobs = (
+        select(ValidationJob.id)
+        .where(
+            or_(
+                and_(
+                    ValidationJob.status == ValidationJobStatusEnum.PENDING,
+                    ValidationJob.run_at <= now,
+                ),
+                and_(
+                    ValidationJob.status == ValidationJobStatusEnum.RUNNING,
+                    ValidationJob.started_at <= now - timedelta(seconds=VALIDATION_JOB_LEASE),
+                ),
+            )
+        )
+        .order_by(ValidationJob.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(ValidationJob)
+        .where(ValidationJob.id.in_(due_jobs))
+        .values(
+            status=ValidationJobStatusEnum.RUNNING,
+            started_at=now,
+            attempts=ValidationJob.attempts + 1,
+        )
+        .returning(
+            ValidationJob.id,
+            ValidationJob.kind,
+            ValidationJob.txhash,
+            ValidationJob.attempts,
+            ValidationJob.max_attempts,
+            ValidationJob.created_at,
+        )
+    )
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(stmt)
+        jobs = result.all()
         await session.commit()
-        await session.refresh(asset)
-        print(f"Asset {asset.id} validated.")
+    return jobs
+
+
+async def claim_next_job():
+    jobs = await claim_due_jobs(1)
+    return jobs[0] if jobs else None
+
+
+async def finish_job(job_id: int, status: ValidationJobStatusEnum, error: str | None = None, run_at: datetime | None = None):
+    values = {"status": status, "last_error": error}
+    if status == ValidationJobStatusEnum.PENDING:
+        values["run_at"] = run_at
     else:
-        print("No asset found with that txhash.")
+        values["finished_at"] = _utcnow()
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(ValidationJob).where(ValidationJob.id == job_id).values(**values))
+        await session.commit()
+
+
+VALIDATION_OUTCOMES = counter(
+    "cip_validation_jobs", "Validation jobs finished or rescheduled, by outcome", ("kind", "outcome")
+)
+VALIDATION_LATENCY = histogram(
+    "cip_validation_job_latency_seconds", "Time from enqueue to a terminal job state", ("kind",),
+    buckets=(5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+def _kind_label(kind):
+    return kind.value if isinstance(kind, Enum) else kind
+
+
+class ValidationWorkerPool:
+    """
+    Bounded pool of asyncio workers draining the validationjob table. Each job
+    runs in its own short-lived session, so no request connection is held
+    while a transaction waits to be mined.
+    """
+
+    def __init__(self, concurrency: int = VALIDATION_WORKERS, poll_interval: float = VALIDATION_POLL_INTERVAL,
+                 backend: str = VALIDATION_BACKEND):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.outcomes = Counter()
+        self.latencies = deque(maxlen=1000)  # seconds from enqueue to terminal state
+        self._tasks = []
+        self._stopping = asyncio.Event()
+
+    async def start(self):
+        if self.backend == "rpc" and missing_rpc_settings():
+            raise RuntimeError(
+                f"VALIDATION_BACKEND=rpc needs {', '.join(missing_rpc_settings())}, "
+                f"set them or use the explorer backend"
+            )
+        self._stopping.clear()
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"validation-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+        print(f"Validation worker pool started with {self.concurrency} workers ({self.backend} backend)")
+
+    async def stop(self):
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self, n: int):
+        while not self._stopping.is_set():
+            try:
+                if self.backend == "rpc":
+                    jobs = await claim_due_jobs(RPC_BATCH_SIZE)
+                    if jobs:
+                        await self.run_rpc_batch(jobs)
+                else:
+                    jobs = await claim_due_jobs(1)
+                    for job in jobs:
+                        await self.run_job(job)
+                if not jobs:
+                    await self._sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Validation worker {n} error: {e}", flush=True)
+                await self._sleep(self.poll_interval)
+
+    async def run_job(self, job):
+        validator = VALIDATORS[ValidationJobKindEnum(job.kind)]
+        error = None
+        try:
+            async with AsyncSessionLocal() as session:
+                outcome = await validator(job.txhash, session)
+        except Exception as e:
+            outcome = ValidationOutcome.RETRY
+            error = f"{type(e).__name__}: {e}"
+
+        await self.record(job, outcome, error)
+
+    async def run_rpc_batch(self, jobs):
+        """
+        Resolve a batch of jobs with one batched receipt lookup against the
+        COTI RPC, falling back to the explorer if the RPC call fails.
+        """
+        try:
+            details = await get_rpc_tx_details([job.txhash for job in jobs])
+        except Exception as e:
+            print(f"RPC batch validation failed, using explorer: {e}", flush=True)
+            for job in jobs:
+                await self.run_job(job)
+            return
+
+        for job in jobs:
+            kind = ValidationJobKindEnum(job.kind)
+            error = None
+            try:
+                async with AsyncSessionLocal() as session:
+                    outcome = await MARKERS[kind](session, job.txhash, details[job.txhash], WILL_EVENTS[kind])
+            except Exception as e:
+                outcome = ValidationOutcome.RETRY
+                error = f"{type(e).__name__}: {e}"
+
+            await self.record(job, outcome, error)
+
+    async def record(self, job, outcome: ValidationOutcome, error: str | None = None):
+        if outcome in (ValidationOutcome.RETRY, ValidationOutcome.UNMATCHED) and job.attempts < job.max_attempts:
+            run_at = _utcnow() + timedelta(seconds=backoff_delay(job.attempts))
+            default_error = ("receipt has no matching will event" if outcome == ValidationOutcome.UNMATCHED
+                             else "transaction not final yet")
+            await finish_job(job.id, ValidationJobStatusEnum.PENDING, error or default_error, run_at)
+            self.outcomes["retried"] += 1
+            VALIDATION_OUTCOMES.labels(_kind_label(job.kind), "retried").inc()
+            return
+
+        if outcome == ValidationOutcome.VALIDATED:
+            await finish_job(job.id, ValidationJobStatusEnum.SUCCEEDED)
+        else:
+            reason = error or {
+                ValidationOutcome.RETRY: "transaction not final after max attempts",
+                ValidationOutcome.UNMATCHED: "no matching will event after max attempts",
+                ValidationOutcome.FAILED: "Transaction Failed",
+                ValidationOutcome.MISSING: "No asset found with that txhash",
+            }[outcome]
+            await finish_job(job.id, ValidationJobStatusEnum.FAILED, reason)
+            print(f"Validation job {job.id} failed: {reason}", flush=True)
+
+        self.outcomes[outcome.value] += 1
+        latency = (_utcnow() - job.created_at).total_seconds()
+        self.latencies.append(latency)
+        VALIDATION_OUTCOMES.labels(_kind_label(job.kind), outcome.value).inc()
+        VALIDATION_LATENCY.labels(_kind_label(job.kind)).observe(latency)
+
+    def latency_stats(self):
+        if not self.latencies:
+            return {"count": 0}
+        ordered = sorted(self.latencies)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+        return {
+            "count": len(ordered),
+            "p50_seconds": pick(0.50),
+            "p95_seconds": pick(0.95),
+            "max_seconds": round(ordered[-1], 3),
+        }
+
+
+validation_workers = ValidationWorkerPool()
+
 
+async def queue_stats(session: AsyncSession):
+    """Queue depth per status, age of the oldest due job and worker latency."""
+    result = await session.execute(
+        select(ValidationJob.status, func.count()).group_by(ValidationJob.status)
+    )
+    depth = {row[0].value if isinstance(row[0], Enum) else row[0]: row[1] for row in result.all()}
 
+    result = await session.execute(
+        select(func.min(ValidationJob.run_at)).where(
+            ValidationJob.status == ValidationJobStatusEnum.PENDING,
+            ValidationJob.run_at <= _utcnow(),
+        )
+    )
+    oldest_due = result.scalar()
 
+    return {
+        "depth": depth,
+        "oldest_due_age_seconds": round((_utcnow() - oldest_due).total_seconds(), 3) if oldest_due else 0,
+        "workers": validation_workers.concurrency,
+        "backend": validation_workers.backend,
+        "outcomes": dict(validation_workers.outcomes),
+        "latency": validation_workers.latency_stats(),
+    }
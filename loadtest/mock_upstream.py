@@ -0,0 +1,322 @@
+"""
+Local stand-in for cotiscan and the COTI JSON-RPC node, for load tests.
+
+Serves the explorer endpoints utils.py reads and the JSON-RPC methods the
+validation workers and the distribution bot call, with a configurable
+latency. Every transaction is reported as mined and successful; wallets get
+a deterministic last-activity date so a share of them reads as inactive.
+Receipts carry the WILL_CREATED_EVENT / WILL_FUNDED_EVENT logs for the owner
+and will id the load test packs into the hash (see will_of), but only for
+signatures WalletDistributor.abi.json declares: an event the contract never
+emits is never emitted here either.
+
+    python loadtest/mock_upstream.py --port 8900 --latency-ms 40
+
+Point the app at it with
+    COTI_MAIN=http://127.0.0.1:8900/api/v2/transactions
+    COTI_ADDRESSES_URL=http://127.0.0.1:8900/api/v2/addresses
+    COTI_RPC=http://127.0.0.1:8900/rpc
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import uvicorn
+from eth_utils import keccak
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+CHAIN_ID = 7082400
+GAS_PRICE = 10_000_000_000
+ABI_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "WalletDistributor.abi.json")
+CONTRACT_ADDRESS = os.getenv("WILL_CONTRACT_ADDRESS")
+
+
+def abi_events(path: str = ABI_PATH):
+    """Event entries of the contract ABI by canonical signature."""
+    with open(path) as f:
+        abi = json.load(f)
+    events = {}
+    for entry in abi:
+        if entry.get("type") == "event":
+            signature = f"{entry['name']}({','.join(i['type'] for i in entry['inputs'])})"
+            events[signature] = entry
+    return events
+
+
+def configured_events():
+    """The configured will events the ABI declares, with their topic."""
+    declared = abi_events()
+    events = []
+    for name in ("WILL_CREATED_EVENT", "WILL_FUNDED_EVENT"):
+        signature = (os.getenv(name) or "").replace(" ", "")
+        if not signature:
+            continue
+        if signature not in declared:
+            print(f"mock upstream: {name}={signature} is not in the contract ABI, not emitted")
+            continue
+        events.append(("0x" + keccak(text=signature).hex(), declared[signature]))
+    return events
+
+
+WILL_EVENTS = configured_events()
+
+
+def _hex(value: int):
+    return hex(value)
+
+
+def _fake_hash(seed: str):
+    return "0x" + hashlib.sha256(seed.encode()).hexdigest()
+
+
+def _word(value: int):
+    return "0x" + f"{value:064x}"
+
+
+def will_of(txhash: str):
+    """(owner, will_id) packed into a load-test hash: 8 random, 16 will id and 40 owner hex digits."""
+    digits = txhash[2:].lower()
+    if len(digits) != 64:
+        return None, None
+    try:
+        return "0x" + digits[24:], int(digits[8:24], 16)
+    except ValueError:
+        return None, None
+
+
+class MockChain:
+    """Just enough chain state for nonces, sent transactions and block numbers."""
+
+    def __init__(self, latency: float, jitter: float, inactive_share: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.inactive_share = inactive_share
+        self.started = time.time()
+        self.nonces = {}
+        self.sent = 0
+        self.calls = {}
+
+    @property
+    def block_number(self):
+        # About one block per two seconds, like the real chain
+        return 1_000_000 + int((time.time() - self.started) / 2)
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def last_activity(self, address: str):
+        """Same answer for the same wallet: days since its latest transaction."""
+        bucket = int(hashlib.sha256(address.lower().encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if bucket < self.inactive_share:
+            return 90 + int(bucket * 1000) % 600
+        return int(bucket * 1000) % 7
+
+    def will_logs(self, txhash: str):
+        owner, will_id = will_of(txhash)
+        if owner is None or not CONTRACT_ADDRESS:
+            return []
+        logs = []
+        for topic, event in WILL_EVENTS:
+            topics, data = [topic], []
+            for arg in event["inputs"]:
+                if arg["name"] == "owner":
+                    word = "0x" + owner[2:].rjust(64, "0")
+                elif arg["name"] == "willId":
+                    word = _word(will_id)
+                elif arg["type"] == "address":
+                    word = "0x" + _fake_hash(arg["name"] + txhash)[-40:].rjust(64, "0")
+                else:
+                    word = _word(10 ** 18)
+                (topics if arg.get("indexed") else data).append(word)
+            logs.append({
+                "address": CONTRACT_ADDRESS,
+                "topics": topics,
+                "data": "0x" + "".join(word[2:] for word in data),
+                "transactionHash": txhash,
+                "logIndex": _hex(len(logs)),
+                "removed": False,
+            })
+        return logs
+
+    def receipt(self, txhash: str):
+        return {
+            "transactionHash": txhash,
+            "blockNumber": _hex(self.block_number - 1),
+            "blockHash": _fake_hash("block" + txhash),
+            "transactionIndex": "0x0",
+            "from": "0x0F9Bf01fe3b3eE9027CBf569383761ED55A0b5a2",
+            "to": CONTRACT_ADDRESS,
+            "status": "0x1",
+            "gasUsed": _hex(84_000),
+            "cumulativeGasUsed": _hex(84_000),
+            "effectiveGasPrice": _hex(GAS_PRICE),
+            "contractAddress": None,
+            "logs": self.will_logs(txhash),
+            "logsBloom": "0x" + "00" * 256,
+            "type": "0x0",
+        }
+
+    def transaction(self, txhash: str):
+        return {
+            "hash": txhash,
+            "blockNumber": _hex(self.block_number - 1),
+            "from": "0x0F9Bf01fe3b3eE9027CBf569383761ED55A0b5a2",
+            "to": CONTRACT_ADDRESS,
+            "value": _hex(10 ** 18),
+            "gas": _hex(300_000),
+            "gasPrice": _hex(GAS_PRICE),
+            "nonce": "0x0",
+            "input": "0x",
+        }
+
+    def rpc(self, method: str, params: list):
+        self.count(f"rpc:{method}")
+        if method == "eth_chainId":
+            return _hex(CHAIN_ID)
+        if method == "net_version":
+            return str(CHAIN_ID)
+        if method == "eth_blockNumber":
+            return _hex(self.block_number)
+        if method == "eth_gasPrice":
+            return _hex(GAS_PRICE)
+        if method == "eth_estimateGas":
+            return _hex(84_000)
+        if method == "eth_getTransactionCount":
+            return _hex(self.nonces.get(params[0].lower(), 0))
+        if method == "eth_sendRawTransaction":
+            self.sent += 1
+            return _fake_hash(params[0])
+        if method == "eth_getTransactionReceipt":
+            return self.receipt(params[0])
+        if method == "eth_getTransactionByHash":
+            return self.transaction(params[0])
+        if method == "eth_getBlockByNumber":
+            return {"number": _hex(self.block_number), "baseFeePerGas": _hex(GAS_PRICE), "transactions": []}
+        if method == "eth_call":
+            return "0x"
+        raise LookupError(method)
+
+
+def create_app(chain: MockChain):
+    async def transaction(request: Request):
+        chain.count("cotiscan:transaction")
+        await chain.delay()
+        txhash = request.path_params["txhash"]
+        return JSONResponse({
+            "hash": txhash,
+            "status": "ok",
+            "from": {"hash": "0x0F9Bf01fe3b3eE9027CBf569383761ED55A0b5a2"},
+            "to": {"hash": CONTRACT_ADDRESS, "name": "WalletDistributor"},
+            "value": str(10 ** 18),
+            "timestamp": (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat().replace("+00:00", "Z"),
+            "gas_used": "84000",
+            "fee": {"type": "actual", "value": str(84_000 * GAS_PRICE)},
+        })
+
+    async def address_transactions(request: Request):
+        chain.count("cotiscan:address_transactions")
+        await chain.delay()
+        address = request.path_params["address"]
+        latest = datetime.now(timezone.utc) - timedelta(days=chain.last_activity(address))
+        return JSONResponse({
+            "items": [{
+                "hash": _fake_hash(address),
+                "timestamp": latest.isoformat().replace("+00:00", "Z"),
+                "status": "ok",
+            }],
+            "next_page_params": None,
+        })
+
+    async def rpc(request: Request):
+        await chain.delay()
+        payload = await request.json()
+
+        def answer(call):
+            try:
+                result = chain.rpc(call.get("method"), call.get("params") or [])
+            except LookupError:
+                return {"jsonrpc": "2.0", "id": call.get("id"), "error": {"code": -32601, "message": "Method not found"}}
+            return {"jsonrpc": "2.0", "id": call.get("id"), "result": result}
+
+        if isinstance(payload, list):
+            return JSONResponse([answer(call) for call in payload])
+        return JSONResponse(answer(payload))
+
+    async def stats(request: Request):
+        return JSONResponse({"calls": chain.calls, "raw_transactions_sent": chain.sent})
+
+    return Starlette(routes=[
+        Route("/api/v2/transactions/{txhash}", transaction),
+        Route("/api/v2/addresses/{address}/transactions", address_transactions),
+        Route("/rpc", rpc, methods=["POST"]),
+        Route("/stats", stats),
+    ])
+
+
+class MockUpstream:
+    """Runs the mock on its own thread and event loop, so it does not compete with the load driver."""
+
+    def __init__(self, host="127.0.0.1", port=8900, latency_ms=30.0, jitter_ms=10.0, inactive_share=0.3):
+        self.chain = MockChain(latency_ms / 1000, jitter_ms / 1000, inactive_share)
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(
+            create_app(self.chain), host=host, port=port, log_level="warning", access_log=False,
+        ))
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def env(self):
+        return {
+            "COTI_MAIN": f"{self.base_url}/api/v2/transactions",
+            "COTI_ADDRESSES_URL": f"{self.base_url}/api/v2/addresses",
+            "COTI_RPC": f"{self.base_url}/rpc",
+        }
+
+    def start(self, timeout=10.0):
+        self._thread = threading.Thread(target=self.server.run, name="mock-upstream", daemon=True)
+        self._thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if time.time() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Mock upstream did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--inactive-share", type=float, default=0.3, help="share of wallets that read as inactive")
+    args = parser.parse_args()
+
+    chain = MockChain(args.latency_ms / 1000, args.jitter_ms / 1000, args.inactive_share)
+    uvicorn.run(create_app(chain), host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+End-to-end load test: boots main:app under uvicorn against a throwaway
+Postgres database, with cotiscan and the COTI RPC replaced by the local mock
+(loadtest/mock_upstream.py), then drives a weighted mix of API calls from
+concurrent virtual users and prints per-route latency percentiles and
+throughput as JSON.
+
+    docker compose up -d db
+    LOADTEST_DB_NAME=cip_loadtest python loadtest/run.py \\
+        --users 50 --concurrency 32 --duration 60 \\
+        --mix login=15,create-asset=20,validate-txn-fund=15,return-user-assets=45,cron-inactivity=5 \\
+        --out loadtest-results.json
+
+The database named by LOADTEST_DB_NAME (host and credentials come from the
+usual DB_* settings) is dropped and recreated table by table, never point it
+at a real database. The bot runs against the mock RPC with a throwaway key
+that does not match the bot address, so distributions stop at signing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+from mock_upstream import MockUpstream
+
+load_dotenv(os.path.join(ROOT, ".env"))
+
+DEFAULT_MIX = "login=15,create-asset=20,validate-txn-fund=15,return-user-assets=45,cron-inactivity=5"
+# Well-known development key, it holds nothing on any real network
+THROWAWAY_PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+PASSWORD = "loadtest-password"
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}, pick from {', '.join(SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def db_settings():
+    name = os.getenv("LOADTEST_DB_NAME")
+    if not name:
+        raise SystemExit("Set LOADTEST_DB_NAME to a throwaway database")
+    return {
+        "DB_HOST": os.getenv("DB_HOST", "localhost"),
+        "DB_PORT": os.getenv("DB_PORT", "5432"),
+        "DB_USER": os.getenv("DB_USER", "postgres"),
+        "DB_PASSWORD": os.getenv("DB_PASSWORD", ""),
+        "DB_NAME": name,
+    }
+
+
+async def reset_database(settings):
+    """Recreate the schema and seed the default plan the app expects."""
+    # models binds to database.engine at import, so build the URL ourselves
+    url = (f"postgresql+asyncpg://{settings['DB_USER']}:{settings['DB_PASSWORD']}"
+           f"@{settings['DB_HOST']}:{settings['DB_PORT']}/{settings['DB_NAME']}")
+    os.environ.update(settings)
+    import models  # noqa: F401  registers the tables
+
+    engine = create_async_engine(url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+            await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.execute(text(
+                "INSERT INTO plan (id, name, price, individual_users, multiple_wills, multiple_triggers) "
+                "VALUES (1, 'Load test', 0, true, true, true)"
+            ))
+    finally:
+        await engine.dispose()
+
+
+def start_app(args, env):
+    log = open(args.app_log, "w") if args.app_log else tempfile.NamedTemporaryFile(
+        "w", prefix="cip-loadtest-app-", suffix=".log", delete=False
+    )
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(args.app_port),
+        "--workers", str(args.app_workers), "--log-level", "warning", "--no-access-log",
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    print(f"App started (pid {process.pid}), log in {log.name}", file=sys.stderr)
+    return process
+
+
+def stop_app(process):
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def wait_ready(client, process, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"App exited with code {process.returncode} during startup")
+        try:
+            if (await client.get("/openapi.json")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit("App did not become ready in time")
+
+
+class VirtualUser:
+    def __init__(self, n: int):
+        self.email = f"load{n}-{secrets.token_hex(3)}@example.com"
+        self.wallet = "0x" + secrets.token_hex(20)
+        self.token = None
+        self.asset_ids = []
+        self.block_ids = {}
+        self.block_id = n * 1000
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def txhash(self, will_id: int):
+        """A fresh hash the mock RPC answers with this user's will events, see mock_upstream.will_of."""
+        return "0x" + secrets.token_hex(4) + f"{will_id:016x}" + self.wallet[2:]
+
+
+async def register(client, user: VirtualUser):
+    response = await client.post("/auth/create-user-request-otp", json={
+        "reg_type": "web2", "email": user.email, "password": PASSWORD,
+    })
+    response.raise_for_status()
+    user.token = response.json()["access_token"]
+    response = await client.patch("/auth/account-wallet-update", json={"wallet_address": user.wallet}, headers=user.headers)
+    response.raise_for_status()
+
+
+# === SCENARIOS ===
+# Each returns the response of the call being measured
+
+async def scenario_login(client, user):
+    response = await client.post("/auth/token", data={"email": user.email, "password": PASSWORD})
+    if response.status_code == 200:
+        user.token = response.json()["access_token"]
+    return response
+
+
+async def scenario_create_asset(client, user):
+    user.block_id += 1
+    inactivity = random.random() < 0.3
+    response = await client.post("/process/create-asset", headers=user.headers, json={
+        "asset_type": "COTI",
+        "beneficiaries": [
+            {"wallet_address": "0x" + secrets.token_hex(20), "share_percentage": 60},
+            {"wallet_address": "0x" + secrets.token_hex(20), "share_percentage": 40},
+        ],
+        "trigger_condition": "inactivity" if inactivity else "due_date",
+        "trigger_value": random.randint(1, 12) if inactivity else time.time() + random.randint(3600, 86400 * 365),
+        "txhash": user.txhash(user.block_id),
+        "blockchain_asset_id": user.block_id,
+    })
+    if response.status_code == 201:
+        asset_id = response.json()["asset"]["id"]
+        user.asset_ids.append(asset_id)
+        user.block_ids[asset_id] = user.block_id
+    return response
+
+
+async def scenario_validate_txn_fund(client, user):
+    asset_id = random.choice(user.asset_ids)
+    return await client.patch("/process/validate-txn-fund", headers=user.headers, params={
+        "txhash_funded": user.txhash(user.block_ids[asset_id]),
+        "asset_id": asset_id,
+    })
+
+
+async def scenario_return_user_assets(client, user):
+    return await client.get("/process/return-user-assets", headers=user.headers)
+
+
+async def scenario_cron_inactivity(client, user):
+    return await client.get("/process/cron-inactivity")
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "create-asset": scenario_create_asset,
+    "validate-txn-fund": scenario_validate_txn_fund,
+    "return-user-assets": scenario_return_user_assets,
+    "cron-inactivity": scenario_cron_inactivity,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, seconds: float, status: int | str):
+        self.latencies[route].append(seconds)
+        self.statuses[route][str(status)] += 1
+        # 404 is the expected answer for a user without assets yet
+        if not (isinstance(status, int) and (status < 400 or status == 404)):
+            self.errors[route] += 1
+
+
+async def virtual_user_loop(client, users, scenarios, weights, recorder, deadline, warmup_until):
+    while time.perf_counter() < deadline:
+        user = random.choice(users)
+        name = random.choices(scenarios, weights)[0]
+        if name == "validate-txn-fund" and not user.asset_ids:
+            name = "create-asset"
+        started = time.perf_counter()
+        try:
+            status = (await SCENARIOS[name](client, user)).status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        if started >= warmup_until:
+            recorder.record(name, time.perf_counter() - started, status)
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(latencies, errors, elapsed, statuses=None):
+    ordered = sorted(latencies)
+    summary = {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2) if ordered else None,
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2) if ordered else None,
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2) if ordered else None,
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else None,
+    }
+    if statuses is not None:
+        summary["statuses"] = dict(statuses)
+    return summary
+
+
+async def drive(client, args, weights):
+    users = [VirtualUser(n) for n in range(args.users)]
+    for start in range(0, len(users), args.concurrency):
+        await asyncio.gather(*(register(client, u) for u in users[start:start + args.concurrency]))
+    print(f"Registered {len(users)} users", file=sys.stderr)
+
+    recorder = Recorder()
+    scenarios = list(weights)
+    warmup_until = time.perf_counter() + args.warmup
+    deadline = warmup_until + args.duration
+    await asyncio.gather(*(
+        virtual_user_loop(client, users, scenarios, [weights[s] for s in scenarios], recorder, deadline, warmup_until)
+        for _ in range(args.concurrency)
+    ))
+    return recorder, time.perf_counter() - warmup_until
+
+
+async def run(args):
+    weights = parse_mix(args.mix)
+    if args.validation_backend == "rpc":
+        # Same settings events.missing_rpc_settings checks, read before the app is started
+        missing = [name for name in ("WILL_CONTRACT_ADDRESS", "WILL_CREATED_EVENT", "WILL_FUNDED_EVENT")
+                   if not os.getenv(name)]
+        if missing:
+            raise SystemExit(f"--validation-backend rpc needs {', '.join(missing)} (see events.py)")
+    settings = db_settings()
+    await reset_database(settings)
+
+    upstream = MockUpstream(port=args.mock_port, latency_ms=args.upstream_latency_ms,
+                            jitter_ms=args.upstream_jitter_ms, inactive_share=args.inactive_share)
+    upstream.start()
+
+    env = dict(os.environ, **settings, **upstream.env())
+    env.update({
+        "PRIVATE_KEY": THROWAWAY_PRIVATE_KEY,
+        "RUN_DISTRIBUTION_BOT": "true" if args.bot else "false",
+        "VALIDATION_BACKEND": args.validation_backend,
+        "INTERNAL_API_TOKEN": "",
+        "INTERNAL_API_OPEN": "true",
+    })
+    process = start_app(args, env)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.app_port}", limits=limits,
+                                     timeout=args.timeout) as client:
+            await wait_ready(client, process)
+            recorder, elapsed = await drive(client, args, weights)
+    finally:
+        stop_app(process)
+        upstream.stop()
+
+    all_latencies = [s for values in recorder.latencies.values() for s in values]
+    report = {
+        "config": {
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "mix": weights,
+            "app_workers": args.app_workers,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "validation_backend": args.validation_backend,
+            "distribution_bot": args.bot,
+        },
+        "measured_seconds": round(elapsed, 2),
+        "total": summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+        "routes": {
+            route: summarize(latencies, recorder.errors[route], elapsed, recorder.statuses[route])
+            for route, latencies in sorted(recorder.latencies.items())
+        },
+        "upstream_calls": dict(upstream.chain.calls),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="registered virtual users")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight")
+    parser.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight pairs")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per request timeout")
+    parser.add_argument("--app-port", type=int, default=8811)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--app-log", help="file for the app output (default: a temp file)")
+    parser.add_argument("--mock-port", type=int, default=8900)
+    parser.add_argument("--upstream-latency-ms", type=float, default=30.0)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--inactive-share", type=float, default=0.3, help="share of wallets the mock reports inactive")
+    parser.add_argument("--validation-backend", choices=("explorer", "rpc"), default="explorer")
+    parser.add_argument("--no-bot", dest="bot", action="store_false", help="do not run the distribution bot in the app")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
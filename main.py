@@ -3,7 +3,7 @@ from fastapi import FastAPI
 from database import engine, get_db
 import models
 from models import User, Plan, Asset, Beneficiary, TriggerCondition
-from routers import  auth, process
+from routers import  auth, process, internal
 from contextlib import asynccontextmanager
 from models import init_db#,  create_db_and_tables,
 from fastapi import Depends, HTTPException, status, Request
@@ -22,8 +22,13 @@ from starlette_admin.contrib.sqla import Admin, ModelView
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from dotenv import load_dotenv
-import threading
-from distri import main
+from distri import DistributionBot
+from utils import init_http_client, close_http_client
+from events import validation_workers
+from plans import plan_catalog
+from responses import CIPJSONResponse
+from metrics import MetricsMiddleware
+from db_instrumentation import DB_INSTRUMENT, QueryStatsMiddleware
 load_dotenv()
 
 
@@ -38,18 +43,35 @@ origins = [
 
 import asyncpg
 
+RUN_DISTRIBUTION_BOT = os.getenv("RUN_DISTRIBUTION_BOT", "true").lower() in ("1", "true", "yes")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Code to run on startup
     print("db created ")
     #create_db_and_tables()
-    threading.Thread(target=main, daemon=True).start()
     await init_db()
     print("db updated")
+    await plan_catalog.load()
+    await init_http_client()
+    await validation_workers.start()
+    # Set RUN_DISTRIBUTION_BOT=false when the bot runs as its own worker (python distri.py)
+    bot = None
+    if RUN_DISTRIBUTION_BOT:
+        bot = DistributionBot()
+        bot.start()
+    app.state.distribution_bot = bot
     yield  # Your application runs during this yield
+    # Code to run on shutdown
+    if bot is not None:
+        await bot.stop()
+    await validation_workers.stop()
+    await close_http_client()
+    auth.password_executor.shutdown(wait=False)
 
 app = FastAPI(lifespan=lifespan, title="Crypto Investment Protocol CIP", 
+              default_response_class=CIPJSONResponse,
               summary="This is Backend by @elinteerie@gmail.com", 
               version="1.0", 
               debug=True)
@@ -61,11 +83,16 @@ app.add_middleware(
     allow_methods=["*"],             # Allow all HTTP methods
     allow_headers=["*"],             # Allow all headers
 )
+app.add_middleware(MetricsMiddleware)
+if DB_INSTRUMENT:
+    app.add_middleware(QueryStatsMiddleware)
 
 
 #Include routers
 app.include_router(auth.router)
 app.include_router(process.router)
+app.include_router(internal.router)
+app.include_router(internal.metrics_router)
 
 #static and templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -160,6 +187,7 @@ admin.add_view(ModelView(models.Plan))
 admin.add_view(ModelView(models.Asset))
 admin.add_view(ModelView(models.Beneficiary))
 admin.add_view(ModelView(models.TriggerCondition))
+admin.add_view(ModelView(models.ValidationJob))
 
 
 
@@ -2,7 +2,7 @@ from database import engine
 from sqlmodel import SQLModel, Field, Relationship
 from typing import List, Optional
 import string
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, BigInteger, Index, text
 from datetime import datetime, timezone, timedelta, date
 import uuid
 from enum import Enum
@@ -36,6 +36,18 @@ class TriggerTypeEnum(str, Enum):
     DUE_DATE = "due_date"
 
 
+class ValidationJobKindEnum(str, Enum):
+    ASSET_CREATED = "asset_created"
+    ASSET_FUNDED = "asset_funded"
+
+
+class ValidationJobStatusEnum(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
 class AssetTypeEnum(str, Enum):
     #BTC = "BTC"
     #ETH = "ETH"
@@ -47,7 +59,7 @@ class AssetTypeEnum(str, Enum):
 
 class User(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True, index=True)
-    email: str  = Field(nullable=True)
+    email: str  = Field(nullable=True, index=True)
     balance: Decimal = Field(default=0, max_digits=12, decimal_places=2)
     is_active: bool = Field(default=False)
     role: RoleEnum = Field(nullable=True, default="user")
@@ -77,16 +89,35 @@ class Asset(SQLModel, table=True):
     validated_funds: bool | None = Field(default=False)
     distributed: bool | None = Field(default=False)
     is_now_due_date: bool | None = Field(default=False)
+    # Unix time the trigger fires: the due date for DUE_DATE wills, the time the
+    # owner was found inactive for INACTIVITY wills (None until then)
+    next_fire_at: int | None = Field(default=None, sa_type=BigInteger)
+    # Last distribute transaction sent and its nonce, checked before sending another one
+    distribution_txhash: str | None = Field(default=None)
+    distribution_nonce: int | None = Field(default=None, sa_type=BigInteger)
+    # Reverted distributions so far, each one backs the next attempt off further
+    distribution_reverts: int = Field(default=0)
     beneficiaries: List["Beneficiary"] = Relationship(back_populates="asset", cascade_delete=True)
     trigger_condition: Optional["TriggerCondition"] = Relationship(back_populates="asset", cascade_delete=True)
 
+    __table_args__ = (
+        # Serves owner lookups on its own (leading column) and asset-supported
+        Index("ix_asset_owner_validated", "owner_id", "validated_created", "validated_funds"),
+        # Ready wills are a range scan on this partial index
+        Index(
+            "ix_asset_ready_next_fire_at",
+            "next_fire_at",
+            postgresql_where=text("validated_funds AND NOT distributed"),
+        ),
+    )
+
 
 
 class Beneficiary(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     wallet_address: str
     share_percentage: Decimal
-    asset_id: Optional[int] = Field(default=None, foreign_key="asset.id")
+    asset_id: Optional[int] = Field(default=None, foreign_key="asset.id", index=True)
     asset: Optional[Asset] = Relationship(back_populates="beneficiaries")
 
 
@@ -114,11 +145,42 @@ class TriggerCondition(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     condition_type: TriggerTypeEnum
     value: Optional[int] = None
-    asset_id: Optional[int] = Field(default=None, foreign_key="asset.id")
+    asset_id: Optional[int] = Field(default=None, foreign_key="asset.id", index=True)
     asset: Optional[Asset] = Relationship(back_populates="trigger_condition")
 
 
 
+class FinalizedTransaction(SQLModel, table=True):
+    """Explorer details of a mined transaction, they never change once final."""
+    txhash: str = Field(primary_key=True)
+    status: str
+    from_address: str | None = None
+    to_address: str | None = None
+    contract_name: str | None = None
+    value_sent: str | None = None
+    timestamp: str | None = None
+    gas_used: str | None = None
+    transaction_fee: str | None = None
+    cached_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+
+
+class ValidationJob(SQLModel, table=True):
+    """On-chain validation of an asset transaction, picked up by the worker pool."""
+    id: int | None = Field(default=None, primary_key=True)
+    kind: ValidationJobKindEnum
+    txhash: str = Field(index=True)
+    status: ValidationJobStatusEnum = Field(default=ValidationJobStatusEnum.PENDING, index=True)
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=8)
+    run_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc).replace(tzinfo=None), index=True)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    last_error: str | None = None
+
+
+
 class ResetPassword(SQLModel, table=False):
     email: str = Field(description="Be A Valid Email Address")
     password: str  = Field(description="Password")
@@ -149,6 +211,72 @@ class CreateAssetSchema(SQLModel, table =False):
     blockchain_asset_id: int
 
 
+class CreateAssetBatchSchema(SQLModel, table =False):
+    assets: List[CreateAssetSchema]
+
+
+class BeneficiaryShareResponse(SQLModel, table=False):
+    wallet_address: str
+    share: str
+
+
+class TriggerConditionResponse(SQLModel, table=False):
+    type: TriggerTypeEnum
+    value: Optional[int] = None
+
+
+class AssetListItemResponse(SQLModel, table=False):
+    # Everything but id is optional, return-user-assets can be asked for a subset
+    id: int
+    type: Optional[AssetTypeEnum] = None
+    validated_created: Optional[bool] = None
+    block_id: Optional[int] = None
+    validated_funded: Optional[bool] = None
+    beneficiaries: Optional[List[BeneficiaryShareResponse]] = None
+    trigger_condition: Optional[TriggerConditionResponse] = None
+
+
+class AssetPageResponse(SQLModel, table=False):
+    status: str
+    assets: List[AssetListItemResponse]
+    next_cursor: Optional[int] = None
+
+
+class NamedShareResponse(SQLModel, table=False):
+    name: str
+    share: str
+
+
+class AssetDetailResponse(SQLModel, table=False):
+    id: int
+    type: AssetTypeEnum
+    owner: Optional[str] = None
+    beneficiaries: List[NamedShareResponse]
+    trigger_condition: Optional[TriggerTypeEnum] = None
+    txhash: Optional[str] = None
+    validated_created: Optional[bool] = None
+    block_id: Optional[int] = None
+    validated_funded: Optional[bool] = None
+    asset_wallet_address: str
+
+
+class AnAssetResponse(SQLModel, table=False):
+    status: str
+    asset: AssetDetailResponse
+
+
+class PlansResponse(SQLModel, table=False):
+    plans: List[Plan]
+
+
+class UserInfoResponse(SQLModel, table=False):
+    status: str
+    wallet_address: Optional[str] = None
+    public_key: Optional[str] = None
+    is_wallet_connected: Optional[bool] = None
+    Plan_id: Optional[int] = None
+
+
 class CreateAssetSchemaSome(SQLModel, table =False):
     asset_type: AssetTypeEnum
     percentage: Decimal
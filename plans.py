@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlmodel import select
+from database import AsyncSessionLocal
+from models import Plan
+
+load_dotenv()
+
+# Safety net for edits made by another process, local edits invalidate at once
+PLAN_CATALOG_TTL = float(os.getenv("PLAN_CATALOG_TTL", 300))
+
+# Plan assigned to every new account
+DEFAULT_PLAN_ID = 1
+
+PLAN_FEATURES = (
+    "individual_users",
+    "multiple_wills",
+    "multiple_triggers",
+    "crypto_investors",
+    "legal_executors",
+    "institutions",
+    "create_inherent_plans",
+    "multi_signature_wallet",
+    "encrypted_document_storage",
+    "ai_fraud_detection",
+    "ai_powered_plan_creation",
+    "api_access_for_institution",
+)
+
+
+class PlanCatalog:
+    """
+    Process-wide copy of the plan table. Plans are loaded once (at startup or
+    on first use) and served from memory together with the set of feature
+    flags each plan enables, so plan lookups and entitlement checks do no I/O.
+    """
+
+    def __init__(self, ttl: float = PLAN_CATALOG_TTL):
+        self.ttl = ttl
+        self._plans = {}
+        self._features = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Plan).order_by(Plan.id))
+            plans = result.scalars().all()
+
+        self._plans = {plan.id: plan for plan in plans}
+        self._features = {
+            plan.id: frozenset(feature for feature in PLAN_FEATURES if getattr(plan, feature))
+            for plan in plans
+        }
+        self._loaded_at = time.monotonic()
+        print(f"Plan catalog loaded {len(self._plans)} plans")
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+                await self.load()
+
+    async def all(self):
+        await self._ensure_loaded()
+        return list(self._plans.values())
+
+    async def get(self, plan_id: int | None):
+        await self._ensure_loaded()
+        return self._plans.get(plan_id)
+
+    async def features(self, plan_id: int | None):
+        await self._ensure_loaded()
+        return self._features.get(plan_id, frozenset())
+
+
+plan_catalog = PlanCatalog()
+
+
+@event.listens_for(Plan, "after_insert")
+@event.listens_for(Plan, "after_update")
+@event.listens_for(Plan, "after_delete")
+def _invalidate_plan_catalog(mapper, connection, target):
+    # Fires for the admin ModelView as well as API writes
+    plan_catalog.invalidate()
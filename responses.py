@@ -0,0 +1,38 @@
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(obj):
+    """orjson fallback for the types the API returns that it does not handle natively."""
+    if isinstance(obj, Decimal):
+        # Same rule as FastAPI's decimal_encoder: whole numbers stay ints
+        if obj.as_tuple().exponent >= 0:
+            return int(obj)
+        return float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any, sort_keys: bool = False) -> bytes:
+    option = orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(content, default=_default, option=option)
+
+
+class CIPJSONResponse(JSONResponse):
+    """
+    Default response class of the app. Renders with orjson, which also
+    serializes datetimes, UUIDs, enums and dataclasses natively; Decimals and
+    anything else FastAPI's encoder would accept go through `_default`.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
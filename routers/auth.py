@@ -2,10 +2,10 @@ from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, status, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from pydantic import BaseModel, Field, EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, object_session
 from database import get_db
 from models import (User, CreateUserRequest,  EmailVRequest, ResetPassword, Plan,
-                     UpdateUserInfoRequest)
+                     UpdateUserInfoRequest, UserInfoResponse)
 from passlib.context import CryptContext
 from typing import Annotated
 from sqlalchemy import or_
@@ -21,6 +21,13 @@ from fastapi import Form
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 import re
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+from sqlalchemy import event
+from cache import TTLCache
+from plans import plan_catalog, DEFAULT_PLAN_ID
 
 
 load_dotenv()
@@ -36,10 +43,24 @@ ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES')
 router = APIRouter(prefix='/auth',tags=['Authentication'])
 
 #Encrypt Password
-bcrypt_context = CryptContext(schemes=['argon2', 'bcrypt'], default='bcrypt', deprecated='auto')
+# Work factor for new hashes; older or weaker hashes are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# bcrypt releases the GIL, so a thread pool hashes in parallel off the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+
+bcrypt_context = CryptContext(schemes=['argon2', 'bcrypt'], default='bcrypt', deprecated='auto',
+                              bcrypt__rounds=BCRYPT_ROUNDS)
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+
+# token digest -> User snapshot, plus user id -> digests for invalidation
+auth_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL, name="auth_context")
+_user_token_digests: dict[int, set[str]] = {}
+
 
 
 
@@ -93,6 +114,16 @@ class OAuthWalletRequestForm:
 
 
 #Authenticate Users
+async def hash_password(password: str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, bcrypt_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, bcrypt_context.verify, password, hashed_password)
+
+
 async def authenticate_user(email: str, password: str, db: db_dependency):
 
     statement = select(User).where(User.email == email)
@@ -104,8 +135,14 @@ async def authenticate_user(email: str, password: str, db: db_dependency):
     if not user:
         return False
     
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not user.hashed_password or not await verify_password(password, user.hashed_password):
         return False
+
+    # Transparently re-hash with the current scheme and work factor
+    if bcrypt_context.needs_update(user.hashed_password):
+        user.hashed_password = await hash_password(password)
+        await db.commit()
+
     return user
 
 #Create a JWT
@@ -123,34 +160,110 @@ async def get_user_by_id(user_id: int, db):
     return user
 
 #Decode a JWT
-async def get_current_user(request: Request, db: db_dependency):
+def _token_digest(token: str):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _remember_token(user_id: int, digest: str):
+    # Drop digests that already left the cache so the index stays bounded
+    digests = {d for d in _user_token_digests.get(user_id, ()) if d in auth_cache}
+    digests.add(digest)
+    _user_token_digests[user_id] = digests
+
+
+def invalidate_user(user_id: int):
+    """Forget every cached auth context of `user_id`."""
+    for digest in _user_token_digests.pop(user_id, ()):
+        auth_cache.invalidate(digest)
+
+
+_STALE_USERS = "stale_user_ids"
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_stale_user(mapper, connection, target):
+    # Covers every write path (API handlers, admin views): wallet, plan, ...
+    # Flush runs before commit, evicting here would let a concurrent request
+    # cache the old row again, so the ids wait in the session for the commit.
+    session = object_session(target)
+    if session is None:
+        invalidate_user(target.id)
+        return
+    session.info.setdefault(_STALE_USERS, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop(_STALE_USERS, ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session):
+    session.info.pop(_STALE_USERS, None)
+
+
+async def get_current_user_model(request: Request, db: db_dependency):
+    """
+    Resolve the bearer token to its User.
+
+    The result is kept on request.state for the rest of the request and in a
+    process-wide TTL cache keyed by the token's digest, so repeat requests
+    with the same token skip both the JWT decode and the user query. The
+    cached User is a detached snapshot: handlers that modify the user load a
+    fresh row with `await db.get(User, user.id)`.
+    """
+    cached = getattr(request.state, "current_user", None)
+    if cached is not None:
+        return cached
 
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Authorization token is missing or invalid")
     
     token = auth_header.split(" ")[1]
-    print("token:", token)
-    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-
-    print("payload")
-        
-    # Extract common claims
-    username: str = payload.get('sub')
-    user_id: int = payload.get('id')
-
-    statement = select(User).where(User.id==user_id)
-    user = await db.execute(statement)
-    user = user.scalars().first()
+    digest = _token_digest(token)
+
+    user = auth_cache.get(digest)
+    if user is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Authorization token is missing or invalid")
+
+        # Extract common claims
+        user_id: int = payload.get('id')
+
+        statement = select(User).where(User.id==user_id)
+        user = await db.execute(statement)
+        user = user.scalars().first()
+
+        if not user:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No User Found, Please Log In")
+
+        # Never cache past the token's own expiry
+        ttl = AUTH_CACHE_TTL
+        if payload.get("exp"):
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            # Copied without validation: nullable columns (public_key...) are typed as plain str
+            auth_cache.set(digest, User(**user.model_dump()), ttl=ttl)
+            _remember_token(user.id, digest)
+
+    request.state.current_user = user
+    return user
 
-    if not user:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No User Found, Please Log In")
 
-    #print("token:", user)
+async def get_current_user(request: Request, db: db_dependency):
+    user = await get_current_user_model(request, db)
     return {
             'username': user.email,
             'id': user.id
         }
+
+
+user_dependency = Annotated[User, Depends(get_current_user_model)]
     
         
 
@@ -207,29 +320,21 @@ async def create_user_request_otp(request: CreateUserRequest, db: db_dependency)
 
         validate_email(request.email)   # ✅ Valid
 
-        hashed_passwords = bcrypt_context.hash(request.password)
+        hashed_passwords = await hash_password(request.password)
 
 
+        ## add Plan to user
+        plan = await plan_catalog.get(DEFAULT_PLAN_ID)
+
         create_user= User(
             email=request.email,
             hashed_password=hashed_passwords,
             is_active=True,
-            role="user")
+            role="user",
+            plan_id=plan.id if plan else None)
 
         db.add(create_user)
         await db.commit()
-        await db.refresh(create_user)
-
-        ## add Plan to user
-
-        statement = select(Plan).where(Plan.id ==1)
-        result = await db.execute(statement)
-        plan = result.scalars().first()
-
-        create_user.plan = plan
-
-        await db.commit()
-        db.refresh(existing_user)
 
         token = await create_access_token(create_user.email, create_user.wallet_address, create_user.id, timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES)))
 
@@ -263,28 +368,20 @@ async def create_user_request_otp(request: CreateUserRequest, db: db_dependency)
             detail=f"Please Input the Wallet Address to Proceed"
         )
 
+        plan = await plan_catalog.get(DEFAULT_PLAN_ID)
+
         create_user= User(
             wallet_address=request.wallet_address,
             is_active=True,
             is_wallet_connected=True,
-            role="user")
+            role="user",
+            plan_id=plan.id if plan else None)
 
         db.add(create_user)
         await db.commit()
-        db.refresh(create_user)
-
-
-        statement = select(Plan).where(Plan.id ==1)
-        result = await db.execute(statement)
-        plan = result.scalars().first()
 
-        create_user.plan = plan
 
-        await db.commit()
-        db.refresh(existing_user)
-
-
-        token = await create_access_token(create_user.email, create_user.wallet_address, create_user.public_key, create_user.id, timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES)))
+        token = await create_access_token(create_user.email, create_user.wallet_address, create_user.id, timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES)))
 
 
 
@@ -364,16 +461,9 @@ async def login_for_access_token(db: db_dependency, form_data: OAuthWalletReques
 
 
 
-@router.get("/user-info",status_code=status.HTTP_200_OK )
-async def user_info(db: db_dependency, user: dict= Depends(get_current_user)):
-
-    user_id = user.get("id")
+@router.get("/user-info", response_model=UserInfoResponse, status_code=status.HTTP_200_OK)
+async def user_info(existing_user: user_dependency):
 
-    print("userid:", user_id)
-    result = select(User).where(User.id == user_id)
-    existing_users = await db.execute(result)
-    existing_user = existing_users.scalars().first()
-    
     return {
         "status": "User Information",
         "wallet_address": existing_user.wallet_address,
@@ -384,17 +474,13 @@ async def user_info(db: db_dependency, user: dict= Depends(get_current_user)):
 
 
 @router.patch('/account-wallet-update', status_code=status.HTTP_200_OK)
-async def account_info_update(request: UpdateUserInfoRequest, db: db_dependency, user: dict= Depends(get_current_user)):
+async def account_info_update(request: UpdateUserInfoRequest, db: db_dependency, user: user_dependency):
     """
    Connect Wallet after web2 route {"wallet_address": "786787"
     
      }
     """
-    user_id = user.get("id")
-    print("userid:", user_id)
-    result = select(User).where(User.id == user_id)
-    existing_user = await db.execute(result)
-    existing_user = existing_user.scalars().first()
+    existing_user = await db.get(User, user.id)
     print("userw:", request.wallet_address)
 
     if not request.wallet_address or request.wallet_address.strip() == "":
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, status, HTTPException, Request, Response
+from database import get_db, pool_stats
+from typing import Annotated, Literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+import hmac
+import os
+from events import queue_stats
+from metrics import REGISTRY, CONTENT_TYPE
+from db_instrumentation import DB_INSTRUMENT, DB_SLOW_QUERY_MS, top_queries, reset_queries
+
+
+load_dotenv()
+
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
+# Local development only: serve the internal endpoints without a token
+INTERNAL_API_OPEN = os.getenv("INTERNAL_API_OPEN", "false").lower() in ("1", "true", "yes")
+
+
+async def verify_internal_token(request: Request):
+    """
+    The caller must send INTERNAL_API_TOKEN in the X-Internal-Token header or
+    as a bearer token. Without a configured token the endpoints are disabled,
+    unless INTERNAL_API_OPEN is set for local development.
+    """
+    if not INTERNAL_API_TOKEN:
+        if INTERNAL_API_OPEN:
+            return
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Internal endpoints are disabled")
+    token = request.headers.get("X-Internal-Token")
+    if token is None:
+        # Prometheus scrapers can only send a bearer token
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if token is None or not hmac.compare_digest(token.encode(), INTERNAL_API_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
+
+
+router = APIRouter(prefix='/internal', tags=['Internal'], dependencies=[Depends(verify_internal_token)])
+# /metrics sits at the root where Prometheus expects it, behind the same token
+metrics_router = APIRouter(tags=['Internal'], dependencies=[Depends(verify_internal_token)])
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+
+
+@router.get("/validation-queue", status_code=status.HTTP_200_OK)
+async def validation_queue(db: db_dependency):
+    """
+    Depth of the validation job queue and enqueue-to-done latency of this worker pool.
+    """
+    return await queue_stats(db)
+
+
+@router.get("/db-pool", status_code=status.HTTP_200_OK)
+async def db_pool():
+    """
+    Connection pool occupancy and checkout wait times of this process.
+    """
+    return pool_stats()
+
+
+@router.get("/db-queries", status_code=status.HTTP_200_OK)
+async def db_queries(limit: int = 20, order_by: Literal["total", "mean", "count"] = "total"):
+    """
+    Heaviest SQL statement shapes seen by this process (needs DB_INSTRUMENT=true).
+    """
+    return {
+        "enabled": DB_INSTRUMENT,
+        "slow_query_ms": DB_SLOW_QUERY_MS,
+        "queries": top_queries(limit, order_by),
+    }
+
+
+@router.delete("/db-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_db_queries():
+    reset_queries()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus text exposition of the process metrics.
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
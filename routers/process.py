@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from database import get_db
 from models import (User, Plan, TriggerTypeEnum, AssetTypeEnum,
@@ -10,15 +10,23 @@ from jose import JWTError, jwt
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
 import json
-from routers.auth import get_current_user
+import hashlib
+from routers.auth import get_current_user, user_dependency
 from sqlmodel import select
 from fastapi import Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert
+from sqlalchemy.exc import IntegrityError
 import time
+import asyncio
 from utils import get_important_tx_details, get_latest_transaction
-from events import validate_asset_created_async, validate_asset_funded_async
+from events import enqueue_validation, enqueue_validations
+from models import (ValidationJobKindEnum, CreateAssetBatchSchema, PlansResponse,
+AnAssetResponse, AssetPageResponse)
+from responses import CIPJSONResponse, dumps
+from scheduler import trigger_scheduler
+from plans import plan_catalog
 
 
 
@@ -26,13 +34,77 @@ from events import validate_asset_created_async, validate_asset_funded_async
 router = APIRouter(prefix='/process',tags=['Plans And Triggers'])
 db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
+load_dotenv()
 
-@router.get("/get-all-plans", status_code=status.HTTP_200_OK)
-async def get_all_plans(db: db_dependency, user: dict= Depends(get_current_user)):
+INACTIVITY_SCAN_CONCURRENCY = int(os.getenv("INACTIVITY_SCAN_CONCURRENCY", 10))
+INACTIVITY_SCAN_MAX_CONCURRENCY = int(os.getenv("INACTIVITY_SCAN_MAX_CONCURRENCY", 50))
+INACTIVITY_COMMIT_BATCH_SIZE = int(os.getenv("INACTIVITY_COMMIT_BATCH_SIZE", 100))
+MAX_BATCH_ASSETS = int(os.getenv("MAX_BATCH_ASSETS", 500))
+ASSET_PAGE_SIZE = int(os.getenv("ASSET_PAGE_SIZE", 50))
+ASSET_PAGE_SIZE_MAX = int(os.getenv("ASSET_PAGE_SIZE_MAX", 200))
 
-    statement = select(Plan)
-    result = await db.execute(statement)
-    plans = result.scalars().all()
+# Fields return-user-assets can return, in response order, and their columns
+ASSET_LIST_COLUMNS = {
+    "id": Asset.id,
+    "type": Asset.asset_type,
+    "validated_created": Asset.validated_created,
+    "block_id": Asset.blockchain_user_will_id,
+    "validated_funded": Asset.validated_funds,
+}
+ASSET_LIST_FIELDS = tuple(ASSET_LIST_COLUMNS) + ("beneficiaries", "trigger_condition")
+
+
+def initial_next_fire_at(condition_type: TriggerTypeEnum, trigger_value):
+    """DUE_DATE wills fire at their due date, INACTIVITY ones once the cron flags them."""
+    if condition_type == TriggerTypeEnum.DUE_DATE and trigger_value is not None:
+        return int(trigger_value)
+    return None
+
+
+async def save_new_asset(db: AsyncSession, asset_data, validate_creation: bool = True, **asset_fields):
+    """
+    Insert an asset with its beneficiaries, trigger condition and (optionally)
+    its creation validation job in a single transaction. The unit of work
+    flushes once: the beneficiaries go out as one multi-row INSERT ... RETURNING,
+    and a failure leaves no partial rows behind.
+
+    The returned asset keeps its relationships in memory, so the response can
+    be built without re-querying.
+    """
+    asset = Asset(
+        asset_type=asset_data.asset_type,
+        next_fire_at=initial_next_fire_at(asset_data.trigger_condition, asset_data.trigger_value),
+        beneficiaries=[
+            Beneficiary(wallet_address=b.wallet_address, share_percentage=b.share_percentage)
+            for b in asset_data.beneficiaries
+        ],
+        trigger_condition=TriggerCondition(
+            condition_type=asset_data.trigger_condition,
+            value=asset_data.trigger_value,
+        ),
+        **asset_fields
+    )
+    db.add(asset)
+    if validate_creation:
+        await enqueue_validation(db, ValidationJobKindEnum.ASSET_CREATED, asset.txhash)
+
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An asset with this transaction hash already exists.")
+
+    if asset.next_fire_at is not None:
+        # Ignored by the bot until the asset is funded, which schedules it again
+        trigger_scheduler.schedule(asset.id, asset.next_fire_at)
+
+    return asset
+
+
+@router.get("/get-all-plans", response_model=PlansResponse, status_code=status.HTTP_200_OK)
+async def get_all_plans(user: dict= Depends(get_current_user)):
+
+    plans = await plan_catalog.all()
     
     print("plans:", plans)
 
@@ -42,23 +114,20 @@ async def get_all_plans(db: db_dependency, user: dict= Depends(get_current_user)
 
 
 @router.patch("/user-select-plan", status_code=status.HTTP_200_OK)
-async def up_all_plans(db: db_dependency, plan_id:int, user: dict= Depends(get_current_user)):
+async def up_all_plans(db: db_dependency, plan_id:int, user: user_dependency):
 
-    statement = select(Plan).where(Plan.id == plan_id)
-    result = await db.execute(statement)
-    plan = result.scalars().first()
+    plan = await plan_catalog.get(plan_id)
 
-    user_id = user.get("id")
-    result = select(User).where(User.id == user_id)
-    existing_user = await db.execute(result)
-    existing_user = existing_user.scalars().first()
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found.")
+
+    existing_user = await db.get(User, user.id)
     
-    existing_user.plan = plan
+    existing_user.plan_id = plan.id
 
     ##Charge First Before Upgrading
 
     await db.commit()
-    db.refresh(existing_user)
 
     return {
         "status": "Plan Upgraded",
@@ -69,15 +138,10 @@ async def up_all_plans(db: db_dependency, plan_id:int, user: dict= Depends(get_c
 
 
 @router.get("/trigger-types", response_model=List[str], status_code=status.HTTP_200_OK)
-async def get_trigger_types(db: db_dependency, user: dict= Depends(get_current_user)):
+async def get_trigger_types(existing_user: user_dependency):
     """
     Get all available trigger types.
     """
-    user_id = user.get("id")
-    result = select(User).where(User.id == user_id)
-    existing_user = await db.execute(result)
-    existing_user = existing_user.scalars().first()
-
     if existing_user.plan_id ==1:
         return [TriggerTypeEnum.DUE_DATE.value]
 
@@ -87,43 +151,37 @@ async def get_trigger_types(db: db_dependency, user: dict= Depends(get_current_u
 
 
 @router.get("/asset-supported", response_model=List[str], status_code=status.HTTP_200_OK)
-async def get_trigger_types(db: db_dependency, user: dict= Depends(get_current_user)):
+async def get_trigger_types(db: db_dependency, existing_user: user_dependency):
     """
     Get all available trigger types.
     """
-    user_id = user.get("id")
-    result = select(User).where(User.id == user_id)
-    existing_user = await db.execute(result)
-    existing_user = existing_user.scalars().first()
-
+    user_id = existing_user.id
     user_active_plan = existing_user.plan_id
 
     print(user_active_plan)
 
-    stmt = select(Asset).where(
-    Asset.owner_id == user_id,
-    Asset.validated_created.is_(True),
-    Asset.validated_funds.is_(True)
-    )
-
-    result = await db.execute(stmt)
-    asset = result.first()
+    # Only plan 1 is limited to one will, other plans never need the asset query
+    if user_active_plan ==1:
+        stmt = select(Asset.id).where(
+        Asset.owner_id == user_id,
+        Asset.validated_created.is_(True),
+        Asset.validated_funds.is_(True)
+        ).limit(1)
 
-    if user_active_plan ==1 and asset is not None:
-        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="You have to upgrade")
+        result = await db.execute(stmt)
+        asset = result.first()
 
-
-    print(asset)
+        if asset is not None:
+            raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="You have to upgrade")
 
 
     return [asset.value for asset in AssetTypeEnum]
 
 
 @router.post("/create-asset", status_code=status.HTTP_201_CREATED)
-async def create_asset(db: db_dependency, asset_data: CreateAssetSchema, background_tasks: BackgroundTasks, user: dict= Depends(get_current_user)):
+async def create_asset(db: db_dependency, asset_data: CreateAssetSchema, existing_user: user_dependency):
 
     #Check For Plans
-    unix_now = int(time.time())  # returns seconds as an integer
     print("type:", asset_data.trigger_condition.value)
 
     if asset_data.trigger_condition.value =="due_date":
@@ -133,10 +191,7 @@ async def create_asset(db: db_dependency, asset_data: CreateAssetSchema, backgro
     
 
 
-    user_id = user.get("id")
-    result = select(User).where(User.id == user_id)
-    existing_user = await db.execute(result)
-    existing_user = existing_user.scalars().first()
+    user_id = existing_user.id
 
     if not existing_user.plan_id:
         return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You need to select a plan")
@@ -147,16 +202,7 @@ async def create_asset(db: db_dependency, asset_data: CreateAssetSchema, backgro
     if total_percentage != 100:
         raise HTTPException(status_code=400, detail="Total share percentage must equal 100%.")
     
-    # Step 2: Get the user from the database
-    user_id = user.get("id")
-    statement = select(User).where(User.id == user_id)
-    result = await db.execute(statement)
-    existing_user = result.scalars().first()
-    
-    if not existing_user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    
-
+    # Step 2: Check the user loaded by the auth dependency
     if not existing_user.wallet_address and not existing_user.public_key:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please Connect  A Wallet")
     
@@ -167,48 +213,15 @@ async def create_asset(db: db_dependency, asset_data: CreateAssetSchema, backgro
         
     
     
-    # Step 3: Create the Asset
-    asset = Asset(
-        asset_type=asset_data.asset_type,
+    # Step 3: Create the Asset, its beneficiaries and trigger in one transaction
+    asset = await save_new_asset(
+        db,
+        asset_data,
         owner_id=user_id,
         wallet_address=existing_user.wallet_address,
         txhash=asset_data.txhash,
-        blockchain_user_will_id=asset_data.blockchain_asset_id
-    )
-    db.add(asset)
-    await db.commit()
-    await db.refresh(asset)
-
-
-    for b in asset_data.beneficiaries:
-        beneficiary = Beneficiary(
-            wallet_address=b.wallet_address,
-            share_percentage=b.share_percentage,
-            asset_id=asset.id
-        )
-        db.add(beneficiary)
-    await db.commit()
-
-
-    trigger_condition = TriggerCondition(
-        condition_type=asset_data.trigger_condition,
-        value=asset_data.trigger_value,
-        asset=asset
+        blockchain_user_will_id=asset_data.blockchain_asset_id,
     )
-    db.add(trigger_condition)
-    await db.commit()
-    await db.refresh(asset)
-
-    statement = select(Asset).options(
-    selectinload(Asset.beneficiaries),
-    selectinload(Asset.trigger_condition)
-    ).where(Asset.id == asset.id)
-
-    result = await db.execute(statement)
-    asset = result.scalars().first()
-
-
-    background_tasks.add_task(validate_asset_created_async, asset.txhash, db)
 
     print(asset, flush =True)
 
@@ -230,7 +243,7 @@ async def create_asset(db: db_dependency, asset_data: CreateAssetSchema, backgro
 
 
 @router.post("/create-asset-with-percentage", status_code=status.HTTP_201_CREATED)
-async def create_asset(db: db_dependency, asset_data: CreateAssetSchemaSome, user: dict= Depends(get_current_user)):
+async def create_asset(db: db_dependency, asset_data: CreateAssetSchemaSome, existing_user: user_dependency):
 
     #Check for Plan
 
@@ -251,16 +264,7 @@ async def create_asset(db: db_dependency, asset_data: CreateAssetSchemaSome, use
     if total_percentage != 100:
         raise HTTPException(status_code=400, detail="Total share percentage must equal 100%.")
     
-    # Step 2: Get the user from the database
-    user_id = user.get("id")
-    statement = select(User).where(User.id == user_id)
-    result = await db.execute(statement)
-    existing_user = result.scalars().first()
-    
-    if not existing_user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    
-
+    # Step 2: Check the user loaded by the auth dependency
     if not existing_user.wallet_address and not existing_user.public_key:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please Connect  A Wallet")
     
@@ -271,49 +275,16 @@ async def create_asset(db: db_dependency, asset_data: CreateAssetSchemaSome, use
         
     
     
-    # Step 3: Create the Asset
-    asset = Asset(
-        asset_type=asset_data.asset_type,
-        owner_id=user_id,
+    # Step 3: Create the Asset, its beneficiaries and trigger in one transaction
+    asset = await save_new_asset(
+        db,
+        asset_data,
+        validate_creation=False,
+        owner_id=existing_user.id,
         wallet_address= "0x98796788",
         txhash="8977839Jjjdj", 
-        balance=amount
+        balance=amount,
     )
-    db.add(asset)
-    await db.commit()
-    await db.refresh(asset)
-
-
-    for b in asset_data.beneficiaries:
-        beneficiary = Beneficiary(
-            wallet_address=b.wallet_address,
-            share_percentage=b.share_percentage,
-            asset_id=asset.id
-        )
-        db.add(beneficiary)
-    await db.commit()
-
-
-    trigger_condition = TriggerCondition(
-        condition_type=asset_data.trigger_condition,
-        value=asset_data.trigger_value,
-        asset=asset
-    )
-    db.add(trigger_condition)
-    await db.commit()
-    await db.refresh(asset)
-
-    statement = select(Asset).options(
-    selectinload(Asset.beneficiaries),
-    selectinload(Asset.trigger_condition)
-    ).where(Asset.id == asset.id)
-
-    result = await db.execute(statement)
-    asset = result.scalars().first()
-
-
-
-
 
     return {
         "status": "Asset Created",
@@ -330,17 +301,132 @@ async def create_asset(db: db_dependency, asset_data: CreateAssetSchemaSome, use
 
 
 
-@router.get("/an-asset", status_code=status.HTTP_200_OK)
-async def an_asset(db: db_dependency, asset_id, user: dict= Depends(get_current_user)):
+@router.post("/create-assets-batch", status_code=status.HTTP_201_CREATED)
+async def create_assets_batch(db: db_dependency, batch: CreateAssetBatchSchema, existing_user: user_dependency):
+    """
+    Register many wills at once (institution and legal-executor plans).
 
-    user_id = user.get("id")
-    statement = select(User).where(User.id == user_id)
-    result = await db.execute(statement)
-    existing_user = result.scalars().first()
-    
-    if not existing_user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    
+    Every item is validated up front; valid items are inserted with one
+    set-based INSERT per table in a single transaction and their on-chain
+    validations are enqueued together. Invalid items are reported per index
+    and do not block the others.
+    """
+    features = await plan_catalog.features(existing_user.plan_id)
+    if not features & {"institutions", "legal_executors"}:
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="Batch creation needs an institution or legal executor plan")
+
+    if not existing_user.wallet_address:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please Connect  A Wallet")
+
+    if not batch.assets:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No assets in the batch")
+
+    if len(batch.assets) > MAX_BATCH_ASSETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"A batch holds at most {MAX_BATCH_ASSETS} assets")
+
+    # Step 1: Validate every item before writing anything
+    now = time.time()
+    errors = {}
+    seen_txhashes = set()
+    for index, asset_data in enumerate(batch.assets):
+        if sum(b.share_percentage for b in asset_data.beneficiaries) != 100:
+            errors[index] = "Total share percentage must equal 100%."
+        elif asset_data.trigger_condition == TriggerTypeEnum.DUE_DATE and not (asset_data.trigger_value or 0) > now:
+            errors[index] = "Time Must be in the Future"
+        elif asset_data.txhash in seen_txhashes:
+            errors[index] = "Duplicate transaction hash in batch"
+        seen_txhashes.add(asset_data.txhash)
+
+    result = await db.execute(select(Asset.txhash).where(Asset.txhash.in_(seen_txhashes)))
+    existing_txhashes = set(result.scalars().all())
+    for index, asset_data in enumerate(batch.assets):
+        if index not in errors and asset_data.txhash in existing_txhashes:
+            errors[index] = "An asset with this transaction hash already exists."
+
+    valid = [(index, asset_data) for index, asset_data in enumerate(batch.assets) if index not in errors]
+
+    # Step 2: Set-based inserts, one statement per table, one transaction
+    asset_ids = {}
+    if valid:
+        result = await db.execute(
+            insert(Asset).returning(Asset.id, Asset.txhash, sort_by_parameter_order=True),
+            [
+                {
+                    "asset_type": asset_data.asset_type,
+                    "wallet_address": existing_user.wallet_address,
+                    "balance": 0,
+                    "owner_id": existing_user.id,
+                    "txhash": asset_data.txhash,
+                    "txhash_funded": None,
+                    "blockchain_user_will_id": asset_data.blockchain_asset_id,
+                    "validated_created": False,
+                    "validated_funds": False,
+                    "distributed": False,
+                    "is_now_due_date": False,
+                    "next_fire_at": initial_next_fire_at(asset_data.trigger_condition, asset_data.trigger_value),
+                }
+                for _, asset_data in valid
+            ],
+        )
+        asset_ids = {txhash: asset_id for asset_id, txhash in result.all()}
+
+        await db.execute(
+            insert(Beneficiary),
+            [
+                {
+                    "wallet_address": b.wallet_address,
+                    "share_percentage": b.share_percentage,
+                    "asset_id": asset_ids[asset_data.txhash],
+                }
+                for _, asset_data in valid
+                for b in asset_data.beneficiaries
+            ],
+        )
+        await db.execute(
+            insert(TriggerCondition),
+            [
+                {
+                    "condition_type": asset_data.trigger_condition,
+                    "value": asset_data.trigger_value,
+                    "asset_id": asset_ids[asset_data.txhash],
+                }
+                for _, asset_data in valid
+            ],
+        )
+        await enqueue_validations(db, ValidationJobKindEnum.ASSET_CREATED, [a.txhash for _, a in valid])
+
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A transaction hash in the batch was registered concurrently, nothing was created.")
+
+        for _, asset_data in valid:
+            next_fire_at = initial_next_fire_at(asset_data.trigger_condition, asset_data.trigger_value)
+            if next_fire_at is not None:
+                trigger_scheduler.schedule(asset_ids[asset_data.txhash], next_fire_at)
+
+    results = []
+    for index, asset_data in enumerate(batch.assets):
+        if index in errors:
+            results.append({"index": index, "txhash": asset_data.txhash, "status": "failed", "error": errors[index]})
+        else:
+            results.append({"index": index, "txhash": asset_data.txhash, "status": "created", "asset_id": asset_ids[asset_data.txhash]})
+
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"message": "No asset could be created", "results": results})
+
+    return {
+        "status": "Assets Created" if not errors else "Partially Created",
+        "created_count": len(valid),
+        "failed_count": len(errors),
+        "results": results
+    }
+
+
+
+@router.get("/an-asset", response_model=AnAssetResponse, status_code=status.HTTP_200_OK)
+async def an_asset(db: db_dependency, asset_id, existing_user: user_dependency):
 
 
     statement = select(Asset).options(
@@ -369,95 +455,142 @@ async def an_asset(db: db_dependency, asset_id, user: dict= Depends(get_current_
 
 
 
-@router.get("/return-user-assets", status_code=status.HTTP_200_OK)
-async def an_asset(db: db_dependency, user: dict= Depends(get_current_user)):
+def serialize_beneficiary(wallet_address, share_percentage):
+    return {"wallet_address": wallet_address, "share": str(share_percentage)}
 
-    user_id = user.get("id")
-    statement = select(User).where(User.id == user_id)
-    result = await db.execute(statement)
-    existing_user = result.scalars().first()
-    
-    if not existing_user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    
 
+def serialize_trigger(condition_type, value):
+    return {"type": condition_type, "value": value}
 
-    statement = (
-        select(Asset)
-        .options(
-            selectinload(Asset.beneficiaries),
-            selectinload(Asset.trigger_condition)
-        )
-        .where(Asset.owner_id == user_id)
-    )
 
-    result = await db.execute(statement)
-    assets = result.scalars().all()
+def serialize_asset_row(row, fields, beneficiaries, triggers):
+    """
+    One entry of return-user-assets from a column-only row. `beneficiaries`
+    and `triggers` are the child rows grouped by asset id.
+    """
+    data = {"id": row.id}
+    for field in fields:
+        if field == "beneficiaries":
+            data[field] = beneficiaries.get(row.id, [])
+        elif field == "trigger_condition":
+            data[field] = triggers.get(row.id)
+        elif field != "id":
+            data[field] = getattr(row, field)
+    return data
+
+
+def user_assets_page_statement(owner_id: int, fields, after: int | None, limit: int):
+    """Column-only keyset page of an owner's assets, ordered by id."""
+    columns = [Asset.id] + [
+        ASSET_LIST_COLUMNS[f].label(f) for f in fields if f in ASSET_LIST_COLUMNS and f != "id"
+    ]
+    statement = select(*columns).where(Asset.owner_id == owner_id)
+    if after is not None:
+        statement = statement.where(Asset.id > after)
+    return statement.order_by(Asset.id).limit(limit)
 
-    if not assets:
+
+def weak_etag(payload):
+    return 'W/"' + hashlib.sha1(dumps(payload, sort_keys=True)).hexdigest() + '"'
+
+
+@router.get("/return-user-assets", response_model=AssetPageResponse, status_code=status.HTTP_200_OK)
+async def return_user_assets(
+    request: Request,
+    db: db_dependency,
+    existing_user: user_dependency,
+    after: int | None = Query(default=None, description="Cursor: the next_cursor of the previous page"),
+    limit: int = Query(default=ASSET_PAGE_SIZE, ge=1, le=ASSET_PAGE_SIZE_MAX),
+    fields: str | None = Query(default=None, description="Comma separated subset of " + ", ".join(ASSET_LIST_FIELDS)),
+):
+    """
+    The user's assets, ordered by id and paginated with a keyset cursor.
+
+    Only the requested columns are selected (no ORM entities are built) and
+    beneficiaries / trigger conditions are fetched with one `asset_id IN`
+    query each, only when asked for. The response carries a weak ETag, a
+    matching If-None-Match gets 304 Not Modified.
+    """
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in ASSET_LIST_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    else:
+        selected = list(ASSET_LIST_FIELDS)
+
+    # One extra row tells whether there is a next page
+    result = await db.execute(user_assets_page_statement(existing_user.id, selected, after, limit + 1))
+    rows = result.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if not rows and after is None:
         raise HTTPException(status_code=404, detail="No assets found for the user")
 
-    # Serialize the response
-    assets_data = [
-        {
-            "id": asset.id,
-            "type": asset.asset_type,
-            "validated_created": asset.validated_created,
-            "block_id": asset.blockchain_user_will_id,
-            "validated_funded": asset.validated_funds,
-            "beneficiaries": [
-                {"wallet_address": b.wallet_address, "share": str(b.share_percentage)}
-                for b in asset.beneficiaries
-            ],
-            "trigger_condition": {
-                "type": asset.trigger_condition.condition_type,
-                "value": asset.trigger_condition.value
-            } if asset.trigger_condition else None
-        }
-        for asset in assets
-    ]
+    asset_ids = [row.id for row in rows]
+    beneficiaries = {}
+    triggers = {}
+    if asset_ids and "beneficiaries" in selected:
+        result = await db.execute(
+            select(Beneficiary.asset_id, Beneficiary.wallet_address, Beneficiary.share_percentage)
+            .where(Beneficiary.asset_id.in_(asset_ids))
+            .order_by(Beneficiary.asset_id, Beneficiary.id)
+        )
+        for asset_id, wallet_address, share_percentage in result.all():
+            beneficiaries.setdefault(asset_id, []).append(serialize_beneficiary(wallet_address, share_percentage))
+    if asset_ids and "trigger_condition" in selected:
+        result = await db.execute(
+            select(TriggerCondition.asset_id, TriggerCondition.condition_type, TriggerCondition.value)
+            .where(TriggerCondition.asset_id.in_(asset_ids))
+        )
+        for asset_id, condition_type, value in result.all():
+            triggers[asset_id] = serialize_trigger(condition_type, value)
 
-    return {
+    payload = {
         "status": "Success",
-        "assets": assets_data
+        "assets": [serialize_asset_row(row, selected, beneficiaries, triggers) for row in rows],
+        "next_cursor": asset_ids[-1] if has_more else None,
     }
+
+    etag = weak_etag(payload)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Returned directly: the payload is built from plain columns, so it skips
+    # response_model validation (the model documents the shape)
+    return CIPJSONResponse(content=payload, headers=headers)
     
 
 
 
 
 @router.patch("/validate-txn-fund")
-async def validate_txn(db: db_dependency, txhash_funded:str, asset_id:int, background_tasks: BackgroundTasks,  user: dict= Depends(get_current_user)):
+async def validate_txn(db: db_dependency, txhash_funded:str, asset_id:int, existing_user: user_dependency):
+
+    user_id = existing_user.id
 
-    user_id = user.get("id")
-    statement = select(User).where(User.id == user_id)
-    result = await db.execute(statement)
-    existing_user = result.scalars().first()
-    
-    if not existing_user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    
     asset_statement = select(Asset).where(Asset.owner_id==user_id).where(Asset.id==asset_id)
     result = await db.execute(asset_statement)
     asset_to_validate = result.scalar_one_or_none()
 
+    if not asset_to_validate:
+        raise HTTPException(status_code=404, detail="Asset not found.")
+
     asset_to_validate.txhash_funded = txhash_funded
+    await enqueue_validation(db, ValidationJobKindEnum.ASSET_FUNDED, txhash_funded)
     await db.commit()
-    await db.refresh(asset_to_validate)
-
-    background_tasks.add_task(validate_asset_funded_async, asset_to_validate.txhash_funded, db)
     return {
         "message": "Transaction has been Validated"
     }
 
 
 
-@router.get("/cron-inactivity")
-async def cron_inactivity(db: db_dependency):
-    now = int(time.time())
-
-    # query assets where trigger_condition.type == "inactivity"
-    stmt = (
+def inactivity_candidates_statement():
+    """Funded, undistributed assets whose trigger is owner inactivity."""
+    return (
         select(Asset)
         .where(Asset.validated_funds == True)
         .where(Asset.distributed == False)
@@ -469,31 +602,87 @@ async def cron_inactivity(db: db_dependency):
         .options(selectinload(Asset.trigger_condition))
     )
 
-    result = await db.execute(stmt)
+
+@router.get("/cron-inactivity")
+async def cron_inactivity(db: db_dependency, concurrency: int | None = None):
+    """
+    Flag inactivity wills whose owner wallet has been idle past the trigger value.
+
+    Wallets are probed concurrently (bounded by `concurrency`, default
+    INACTIVITY_SCAN_CONCURRENCY) and each wallet is queried once even when it
+    owns several assets. Flags are committed in batches as results arrive, and a
+    failing wallet is reported instead of aborting the run.
+    """
+    started = time.perf_counter()
+    concurrency = max(1, min(concurrency or INACTIVITY_SCAN_CONCURRENCY, INACTIVITY_SCAN_MAX_CONCURRENCY))
+
+    result = await db.execute(inactivity_candidates_statement())
     assets = result.scalars().all()
 
     if not assets:
         return {"message": "No assets with inactivity trigger condition found."}
 
+    # One explorer probe per wallet, shared by every asset it owns
+    assets_by_wallet = {}
+    for asset in assets:
+        assets_by_wallet.setdefault(asset.wallet_address, []).append(asset)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def probe(wallet_address):
+        async with semaphore:
+            try:
+                return wallet_address, await get_latest_transaction(wallet_address), None
+            except HTTPException as e:
+                return wallet_address, None, e.detail
+            except Exception as e:
+                return wallet_address, None, f"{type(e).__name__}: {e}"
+
     updated_assets = []
+    pending_flags = []
+    failures = []
+    commits = 0
 
-    for asset in assets:
-        wallet_address = asset.wallet_address  # adjust if needed
+    for next_result in asyncio.as_completed([probe(w) for w in assets_by_wallet]):
+        wallet_address, score, error = await next_result
 
-        # 🔷 Call your async function
-        latest_tx = await get_latest_transaction(wallet_address)
+        if error is not None:
+            print(f"Inactivity probe failed for {wallet_address}: {error}", flush=True)
+            failures.append({"wallet_address": wallet_address, "error": str(error)})
+            continue
 
         # compare with trigger_condition.value
-        if latest_tx >= asset.trigger_condition.value:
-            asset.is_now_due_date = True
-            updated_assets.append(asset)
-
-    # Commit changes if any
-    if updated_assets:
-        db.add_all(updated_assets)
+        for asset in assets_by_wallet[wallet_address]:
+            threshold = asset.trigger_condition.value
+            if threshold is not None and score >= threshold and not asset.is_now_due_date:
+                asset.is_now_due_date = True
+                asset.next_fire_at = int(time.time())
+                pending_flags.append(asset)
+
+        if len(pending_flags) >= INACTIVITY_COMMIT_BATCH_SIZE:
+            await db.commit()
+            commits += 1
+            updated_assets.extend(pending_flags)
+            for asset in pending_flags:
+                trigger_scheduler.schedule(asset.id, asset.next_fire_at)
+            pending_flags = []
+
+    # Commit the last partial batch
+    if pending_flags:
         await db.commit()
+        commits += 1
+        updated_assets.extend(pending_flags)
+        for asset in pending_flags:
+            trigger_scheduler.schedule(asset.id, asset.next_fire_at)
 
     return {
         "updated_assets_count": len(updated_assets),
-        "updated_asset_ids": [a.id for a in updated_assets]
-    }
\ No newline at end of file
+        "updated_asset_ids": [a.id for a in updated_assets],
+        "assets_scanned": len(assets),
+        "wallets_scanned": len(assets_by_wallet),
+        "failed_wallets_count": len(failures),
+        "failed_wallets": failures,
+        "commits": commits,
+        "concurrency": concurrency,
+        "duration_seconds": round(time.perf_counter() - started, 3)
+    }
@@ -0,0 +1,85 @@
+import asyncio
+import heapq
+import time
+
+
+class TriggerScheduler:
+    """
+    Min-heap of upcoming trigger deadlines (unix seconds) keyed by asset id.
+
+    The distribution bot sleeps until the earliest deadline and only loads the
+    assets that are due. API code calls `schedule` when an asset is created,
+    funded or flagged inactive, which wakes the bot if the new deadline is
+    earlier than the one it is sleeping towards. All methods are meant to be
+    called from the event loop the bot runs on.
+
+    Rescheduling an asset leaves its old heap entry behind; stale entries are
+    skipped when popped (lazy deletion).
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, asset_id: int, deadline: float):
+        self._deadlines[asset_id] = deadline
+        heapq.heappush(self._heap, (deadline, asset_id))
+        self._wakeup.set()
+
+    def cancel(self, asset_id: int):
+        self._deadlines.pop(asset_id, None)
+
+    def load(self, entries):
+        """Replace the schedule with `entries` of (asset_id, deadline)."""
+        self._deadlines = dict(entries)
+        self._heap = [(deadline, asset_id) for asset_id, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _discard_stale(self):
+        while self._heap:
+            deadline, asset_id = self._heap[0]
+            if self._deadlines.get(asset_id) == deadline:
+                return
+            heapq.heappop(self._heap)
+
+    def next_deadline(self):
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float | None = None):
+        """Remove and return the ids of every asset whose deadline has passed."""
+        now = time.time() if now is None else now
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            deadline, asset_id = heapq.heappop(self._heap)
+            del self._deadlines[asset_id]
+            due.append(asset_id)
+        return due
+
+    async def wait(self, max_wait: float):
+        """Sleep until the next deadline, a schedule change, a wake(), or `max_wait`."""
+        self._wakeup.clear()
+        timeout = max_wait
+        next_deadline = self.next_deadline()
+        if next_deadline is not None:
+            timeout = min(timeout, max(0.0, next_deadline - time.time()))
+        if timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+trigger_scheduler = TriggerScheduler()
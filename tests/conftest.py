@@ -0,0 +1,102 @@
+"""
+Shared fixtures. The tests run the app in process against a real Postgres
+database named by TEST_DB_NAME (host and credentials come from the usual
+DB_* settings); it is dropped and recreated table by table for every test,
+never point it at a real database.
+
+    pip install -r requirements-dev.txt
+    TEST_DB_NAME=cip_test python -m pytest -q
+
+Without TEST_DB_NAME the database tests are skipped.
+"""
+import os
+import sys
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# main mounts static/ and distri loads its ABI relative to the working directory
+os.chdir(ROOT)
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(ROOT, ".env"))
+
+TEST_DB_NAME = os.getenv("TEST_DB_NAME")
+
+# Settings the app reads at import time, a real .env still wins for the rest
+if TEST_DB_NAME:
+    os.environ["DB_NAME"] = TEST_DB_NAME
+for name, value in {
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "cip_test",
+    "DB_USER": "postgres",
+    "DB_PASSWORD": "postgres",
+    "SECRET_KEY": "test-secret-key",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+}.items():
+    os.environ.setdefault(name, value)
+os.environ["RUN_DISTRIBUTION_BOT"] = "false"
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlmodel import SQLModel
+
+pytest_plugins = ["tests.query_guard"]
+
+
+@pytest_asyncio.fixture
+async def db_engine():
+    """The app's engine over a freshly created schema."""
+    if not TEST_DB_NAME:
+        pytest.skip("Set TEST_DB_NAME to a throwaway Postgres database to run the database tests")
+
+    from database import engine
+    from plans import plan_catalog
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+    plan_catalog.invalidate()
+    try:
+        yield engine
+    finally:
+        # Pooled connections belong to this test's event loop
+        await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def client(db_engine):
+    """ASGI client for main.app. The lifespan is not run: no bot, no validation workers."""
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        yield client
+
+
+@pytest_asyncio.fixture
+async def user(db_engine):
+    """A user on plan 2 with a connected wallet."""
+    from database import AsyncSessionLocal
+    from models import Plan, User
+
+    async with AsyncSessionLocal() as session:
+        session.add_all([Plan(id=1, name="Basic", price=0), Plan(id=2, name="Investor", price=10)])
+        await session.flush()
+        user = User(email="owner@example.com", is_active=True, wallet_address="0x" + "ab" * 20,
+                    is_wallet_connected=True, plan_id=2)
+        session.add(user)
+        await session.commit()
+    return user
+
+
+@pytest_asyncio.fixture
+async def auth_headers(user):
+    from routers.auth import create_access_token
+
+    token = await create_access_token(user.email, user.wallet_address, user.id, timedelta(minutes=30))
+    return {"Authorization": f"Bearer {token}"}
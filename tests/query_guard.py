@@ -0,0 +1,79 @@
+"""
+Query-count guard for tests, loaded as a pytest plugin by tests/conftest.py:
+
+    pytest_plugins = ["tests.query_guard"]
+
+    async def test_return_user_assets(client, assert_max_queries):
+        with assert_max_queries(3):
+            response = await client.get("/process/return-user-assets")
+
+Statements are counted per context, so the validation workers and the bot
+running in their own tasks do not add to a test's count. The `strict_loading`
+fixture turns database.set_strict_loading on for one test, making any
+implicit lazy load raise.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import pytest
+from sqlalchemy import event
+from database import engine, set_strict_loading, DB_STRICT_LOADING
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+_counter: ContextVar[QueryCounter | None] = ContextVar("query_guard_counter", default=None)
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _counter.get()
+    if counter is not None:
+        counter.statements.append(statement)
+
+
+def _install(engine):
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _record_statement):
+        event.listen(sync_engine, "before_cursor_execute", _record_statement)
+
+
+@contextmanager
+def count_queries(engine=engine):
+    """Count the statements the current task (and tasks it spawns) sends to `engine`."""
+    _install(engine)
+    counter = QueryCounter()
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
+
+
+@contextmanager
+def max_queries(limit: int, engine=engine):
+    """Fail with the offending statements when the block runs more than `limit` queries."""
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        listing = "\n".join(f"  {n}. {' '.join(sql.split())}" for n, sql in enumerate(counter.statements, 1))
+        raise AssertionError(f"Expected at most {limit} queries, {counter.count} were executed:\n{listing}")
+
+
+@pytest.fixture
+def assert_max_queries():
+    return max_queries
+
+
+@pytest.fixture
+def strict_loading():
+    set_strict_loading(True)
+    try:
+        yield
+    finally:
+        set_strict_loading(DB_STRICT_LOADING)
@@ -0,0 +1,40 @@
+"""Cached auth contexts are evicted when a user change commits, not at flush."""
+import pytest
+
+from routers.auth import _token_digest, auth_cache
+
+
+@pytest.mark.asyncio
+async def test_user_update_evicts_on_commit(client, user, auth_headers):
+    from database import AsyncSessionLocal
+    from models import User
+
+    response = await client.get("/auth/user-info", headers=auth_headers)
+    assert response.status_code == 200
+    digest = _token_digest(auth_headers["Authorization"].split()[1])
+    assert digest in auth_cache
+
+    async with AsyncSessionLocal() as session:
+        db_user = await session.get(User, user.id)
+        db_user.plan_id = 1
+        await session.flush()
+        assert digest in auth_cache
+        await session.commit()
+    assert digest not in auth_cache
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_update_keeps_the_cache(client, user, auth_headers):
+    from database import AsyncSessionLocal
+    from models import User
+
+    await client.get("/auth/user-info", headers=auth_headers)
+    digest = _token_digest(auth_headers["Authorization"].split()[1])
+
+    async with AsyncSessionLocal() as session:
+        db_user = await session.get(User, user.id)
+        db_user.plan_id = 1
+        await session.flush()
+        await session.rollback()
+        await session.commit()
+    assert digest in auth_cache
@@ -0,0 +1,78 @@
+"""The bot never resends a distribution that can still be mined."""
+import pytest
+from web3.exceptions import TransactionNotFound
+
+import distri
+from models import Asset
+
+TXHASH = "0x" + "aa" * 32
+
+
+class FakeEth:
+    def __init__(self, confirmed_nonce, receipt=None, known=False):
+        self.confirmed_nonce = confirmed_nonce
+        self.receipt = receipt
+        self.known = known
+
+    async def get_transaction_count(self, address, block):
+        assert block == "latest"
+        return self.confirmed_nonce
+
+    async def get_transaction_receipt(self, txhash):
+        if self.receipt is None:
+            raise TransactionNotFound(txhash)
+        return self.receipt
+
+    async def get_transaction(self, txhash):
+        if not self.known:
+            raise TransactionNotFound(txhash)
+        return {"hash": txhash}
+
+
+def bot_with(eth):
+    bot = distri.DistributionBot.__new__(distri.DistributionBot)
+    bot.web3 = type("FakeWeb3", (), {"eth": eth})()
+    return bot
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("eth, state", [
+    (FakeEth(confirmed_nonce=8, receipt={"status": 1}), "mined"),
+    (FakeEth(confirmed_nonce=7, known=True), "pending"),
+    (FakeEth(confirmed_nonce=7), "dropped"),
+    (FakeEth(confirmed_nonce=8), "replaced"),
+])
+async def test_check_pending(eth, state):
+    asset = Asset(id=1, asset_type="COTI", wallet_address="0x" + "ab" * 20,
+                  distribution_txhash=TXHASH, distribution_nonce=7)
+    assert (await bot_with(eth).check_pending(asset))[0] == state
+
+
+@pytest.mark.asyncio
+async def test_nothing_sent_yet():
+    asset = Asset(id=1, asset_type="COTI", wallet_address="0x" + "ab" * 20)
+    assert await bot_with(FakeEth(confirmed_nonce=0)).check_pending(asset) == ("none", None)
+
+
+@pytest.mark.asyncio
+async def test_reverts_back_off_then_stop(db_engine, user, monkeypatch):
+    from database import AsyncSessionLocal
+
+    monkeypatch.setattr(distri, "DISTRIBUTION_MAX_REVERTS", 3)
+    async with AsyncSessionLocal() as session:
+        asset = Asset(asset_type="COTI", wallet_address=user.wallet_address, owner_id=user.id,
+                      txhash=TXHASH, validated_funds=True, next_fire_at=0,
+                      distribution_txhash=TXHASH, distribution_nonce=7)
+        session.add(asset)
+        await session.commit()
+        asset_id = asset.id
+
+    first = await distri.record_reverted_distribution(asset_id)
+    second = await distri.record_reverted_distribution(asset_id)
+    assert second - first >= distri.DISTRIBUTION_RETRY_SECONDS
+    assert await distri.record_reverted_distribution(asset_id) is None
+
+    async with AsyncSessionLocal() as session:
+        asset = await session.get(Asset, asset_id)
+    assert asset.distribution_reverts == 3
+    assert asset.distribution_txhash is None and asset.next_fire_at is None
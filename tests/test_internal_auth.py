@@ -0,0 +1,40 @@
+"""The internal endpoints fail closed: no configured token, no access."""
+import httpx
+import pytest
+
+from routers import internal
+
+
+@pytest.fixture
+def anon_client():
+    from main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/internal/db-pool", "/metrics"])
+async def test_disabled_without_token(anon_client, monkeypatch, path):
+    monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", None)
+    monkeypatch.setattr(internal, "INTERNAL_API_OPEN", False)
+    async with anon_client as client:
+        assert (await client.get(path)).status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_dev_opt_in_opens_them(anon_client, monkeypatch):
+    monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", None)
+    monkeypatch.setattr(internal, "INTERNAL_API_OPEN", True)
+    async with anon_client as client:
+        assert (await client.get("/internal/db-pool")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_token_required(anon_client, monkeypatch):
+    monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", "s3cret")
+    async with anon_client as client:
+        assert (await client.delete("/internal/db-queries")).status_code == 403
+        assert (await client.get("/metrics", headers={"Authorization": "Bearer nope"})).status_code == 403
+        assert (await client.get("/metrics", headers={"Authorization": "Bearer s3cret"})).status_code == 200
+        response = await client.delete("/internal/db-queries", headers={"X-Internal-Token": "s3cret"})
+        assert response.status_code == 204
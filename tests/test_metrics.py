@@ -0,0 +1,26 @@
+"""Exposition of the in-process metric types."""
+from metrics import Counter, Gauge, Histogram
+
+
+def test_counter_and_gauge_series():
+    requests = Counter("cip_test_requests", "Requests", ("route",))
+    requests.labels("/a").inc()
+    requests.labels("/a").inc(2)
+    assert requests.collect()[-1] == 'cip_test_requests_total{route="/a"} 3'
+
+    queue = Gauge("cip_test_queue", "Queue length")
+    queue.set(4)
+    queue.dec()
+    assert queue.collect() == ["# HELP cip_test_queue Queue length", "# TYPE cip_test_queue gauge", "cip_test_queue 3"]
+
+    queue.set_function(lambda: 7)
+    assert queue.collect()[-1] == "cip_test_queue 7"
+
+
+def test_histogram_series():
+    latency = Histogram("cip_test_latency", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.5)
+    lines = latency.collect()
+    assert 'cip_test_latency_bucket{le="0.1"} 0' in lines
+    assert 'cip_test_latency_bucket{le="+Inf"} 1' in lines
+    assert "cip_test_latency_count 1" in lines
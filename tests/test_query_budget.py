@@ -0,0 +1,82 @@
+"""
+Query budgets for the hot endpoints. A relationship loaded per row or a new
+query in the request path breaks the budget, and with strict loading on any
+implicit lazy load fails the request outright.
+"""
+import time
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+from sqlmodel import select
+
+from tests.query_guard import count_queries
+
+
+def asset_payload(n: int, beneficiaries: int = 3):
+    share = 100 // beneficiaries
+    return {
+        "asset_type": "COTI",
+        "beneficiaries": [
+            {"wallet_address": f"0x{n:020x}{i:020x}", "share_percentage": share + (100 - share * beneficiaries if i == 0 else 0)}
+            for i in range(beneficiaries)
+        ],
+        "trigger_condition": "due_date",
+        "trigger_value": time.time() + 86400 * (n + 1),
+        "txhash": f"0x{n:064x}",
+        "blockchain_asset_id": n,
+    }
+
+
+@pytest.mark.asyncio
+async def test_create_asset_query_budget(client, auth_headers, assert_max_queries, strict_loading):
+    # Warm the auth cache, the budget is for the handler itself
+    response = await client.get("/auth/user-info", headers=auth_headers)
+    assert response.status_code == 200
+
+    with assert_max_queries(4):
+        response = await client.post("/process/create-asset", headers=auth_headers, json=asset_payload(1, 5))
+
+    assert response.status_code == 201, response.text
+    assert len(response.json()["asset"]["beneficiaries"]) == 5
+
+
+@pytest.mark.asyncio
+async def test_return_user_assets_query_budget(client, auth_headers, assert_max_queries, strict_loading):
+    for n in range(12):
+        response = await client.post("/process/create-asset", headers=auth_headers, json=asset_payload(n))
+        assert response.status_code == 201, response.text
+
+    # Three statements whatever the page size: the page and one IN query per child table
+    with assert_max_queries(3):
+        response = await client.get("/process/return-user-assets", headers=auth_headers)
+
+    assert response.status_code == 200, response.text
+    assets = response.json()["assets"]
+    assert len(assets) == 12
+    assert all(len(asset["beneficiaries"]) == 3 and asset["trigger_condition"] for asset in assets)
+
+
+@pytest.mark.asyncio
+async def test_uncached_request_adds_only_the_user_lookup(client, auth_headers):
+    response = await client.post("/process/create-asset", headers=auth_headers, json=asset_payload(1))
+    assert response.status_code == 201, response.text
+
+    from routers.auth import auth_cache
+    auth_cache.clear()
+
+    with count_queries() as counter:
+        response = await client.get("/process/return-user-assets", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert counter.count == 4
+
+
+@pytest.mark.asyncio
+async def test_strict_loading_rejects_lazy_loads(db_engine, user, strict_loading):
+    from database import AsyncSessionLocal
+    from models import User
+
+    async with AsyncSessionLocal() as session:
+        loaded = (await session.execute(select(User).where(User.id == user.id))).scalar_one()
+        with pytest.raises(InvalidRequestError):
+            loaded.assets
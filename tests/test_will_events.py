@@ -0,0 +1,66 @@
+"""RPC validation: receipts are only accepted with the configured will event."""
+import pytest
+from sqlmodel import select
+
+import events
+from utils import event_topic, will_event_details
+
+CONTRACT = "0x" + "11" * 20
+OWNER = "0x" + "ab" * 20
+TOPIC = event_topic("WillDistributed(address,uint256,address,uint256)")
+
+
+def receipt_details(logs):
+    return {"status": "ok", "logs": logs, "value_sent": None}
+
+
+def will_log(will_id, owner=OWNER, topic=TOPIC):
+    return {
+        "address": CONTRACT,
+        "topics": [topic, "0x" + owner[2:].rjust(64, "0"), f"0x{will_id:064x}", "0x" + "22" * 32],
+        "data": f"0x{10 ** 18:064x}",
+        "removed": False,
+    }
+
+
+def test_matching_event_carries_the_amount():
+    details = will_event_details(receipt_details([will_log(7)]), CONTRACT, TOPIC, OWNER, 7)
+    assert details["status"] == "ok"
+    assert details["value_sent"] == str(10 ** 18)
+
+
+@pytest.mark.parametrize("logs", [[], [will_log(8)], [will_log(7, owner="0x" + "cd" * 20)]])
+def test_receipt_without_the_event_is_unmatched(logs):
+    details = will_event_details(receipt_details(logs), CONTRACT, TOPIC, OWNER, 7)
+    assert details["status"] == "unmatched"
+
+
+@pytest.mark.asyncio
+async def test_rpc_backend_refuses_to_start_without_settings(monkeypatch):
+    monkeypatch.setattr(events, "WILL_CONTRACT_ADDRESS", CONTRACT)
+    monkeypatch.setattr(events, "WILL_CREATED_EVENT", None)
+    monkeypatch.setattr(events, "WILL_FUNDED_EVENT", None)
+    pool = events.ValidationWorkerPool(concurrency=1, backend="rpc")
+    with pytest.raises(RuntimeError, match="WILL_CREATED_EVENT, WILL_FUNDED_EVENT"):
+        await pool.start()
+    assert pool._tasks == []
+
+
+@pytest.mark.asyncio
+async def test_unmatched_receipt_is_retried(db_engine):
+    from database import AsyncSessionLocal
+    from models import ValidationJob, ValidationJobKindEnum, ValidationJobStatusEnum
+
+    async with AsyncSessionLocal() as session:
+        await events.enqueue_validation(session, ValidationJobKindEnum.ASSET_CREATED, "0x" + "01" * 32)
+        await session.commit()
+    async with AsyncSessionLocal() as session:
+        job = (await session.execute(select(ValidationJob))).scalar_one()
+
+    pool = events.ValidationWorkerPool(concurrency=1, backend="rpc")
+    await pool.record(job, events.ValidationOutcome.UNMATCHED)
+
+    async with AsyncSessionLocal() as session:
+        job = (await session.execute(select(ValidationJob))).scalar_one()
+    assert job.status == ValidationJobStatusEnum.PENDING
+    assert job.last_error == "receipt has no matching will event"
@@ -4,70 +4,385 @@ import os
 from dotenv import load_dotenv
 from fastapi import HTTPException
 from datetime import datetime, timezone
+from cache import TTLCache
+from eth_utils import keccak
+from metrics import counter, histogram
+import time
+from sqlalchemy.dialects.postgresql import insert
+from database import AsyncSessionLocal
+from models import FinalizedTransaction
 
 load_dotenv()
 
 MAIN_URL = os.getenv('COTI_MAIN')
 
+# Shared explorer client settings, tunable per deployment
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5.0))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10.0))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", 10.0))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client():
+    """
+    Build a pooled keep-alive client. HTTP/2 is negotiated through ALPN, so
+    servers that only speak HTTP/1.1 keep working over the same pool.
+    """
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        HTTP_READ_TIMEOUT,
+        connect=HTTP_CONNECT_TIMEOUT,
+        pool=HTTP_POOL_TIMEOUT,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=HTTP2_ENABLED and _http2_available(),
+    )
+
+
+async def init_http_client():
+    """Create the shared client. Called from the FastAPI lifespan on startup."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared client and its pooled connections on shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_http_client():
+    """
+    Return the shared client, creating it lazily for callers running outside
+    the API lifespan (scripts, the distribution bot).
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+UPSTREAM_REQUEST_DURATION = histogram(
+    "cip_upstream_request_duration_seconds", "Latency of cotiscan and COTI RPC calls", ("endpoint",)
+)
+UPSTREAM_REQUEST_ERRORS = counter(
+    "cip_upstream_request_errors", "Failed cotiscan and COTI RPC calls", ("endpoint", "reason")
+)
+
+
+async def upstream_request(endpoint: str, method: str, url: str, **kwargs):
+    """
+    Send a request with the shared client, raise on an error status and
+    record its latency and failures under `endpoint`.
+    """
+    started = time.perf_counter()
+    try:
+        response = await get_http_client().request(method, url, **kwargs)
+        response.raise_for_status()
+        return response
+    except httpx.HTTPStatusError as e:
+        UPSTREAM_REQUEST_ERRORS.labels(endpoint, e.response.status_code).inc()
+        raise
+    except Exception as e:
+        UPSTREAM_REQUEST_ERRORS.labels(endpoint, type(e).__name__).inc()
+        raise
+    finally:
+        UPSTREAM_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+
+
+# Explorer statuses after which a transaction's details are immutable
+FINALIZED_TX_STATUSES = {"ok", "error"}
+TX_DETAILS_FIELDS = (
+    "status", "from_address", "to_address", "contract_name", "value_sent",
+    "timestamp", "gas_used", "transaction_fee",
+)
+
+TX_DETAILS_CACHE_SIZE = int(os.getenv("TX_DETAILS_CACHE_SIZE", 10000))
+
+# In-memory tier in front of the finalizedtransaction table, no expiry needed
+tx_details_cache = TTLCache(maxsize=TX_DETAILS_CACHE_SIZE, ttl=None, name="tx_details")
+
+
+def _stringify(value):
+    return None if value is None else str(value)
+
+
+async def _load_finalized_tx(txhash):
+    async with AsyncSessionLocal() as session:
+        row = await session.get(FinalizedTransaction, txhash)
+    if row is None:
+        return None
+    details = {"transaction_hash": row.txhash}
+    details.update({field: getattr(row, field) for field in TX_DETAILS_FIELDS})
+    return details
+
+
+async def _store_finalized_tx(txhash, details):
+    values = {field: _stringify(details.get(field)) for field in TX_DETAILS_FIELDS}
+    stmt = (
+        insert(FinalizedTransaction)
+        .values(txhash=txhash, **values)
+        .on_conflict_do_nothing(index_elements=["txhash"])
+    )
+    async with AsyncSessionLocal() as session:
+        await session.execute(stmt)
+        await session.commit()
+
 
 async def get_important_tx_details(txhash):
+    """
+    Explorer details of `txhash`. Finalized transactions are served from the
+    in-memory LRU, then the finalizedtransaction table, and only hit the
+    explorer once; pending transactions are always re-queried.
+    """
+    details = tx_details_cache.get(txhash)
+    if details is not None:
+        return details
+
+    details = await _load_finalized_tx(txhash)
+    if details is not None:
+        tx_details_cache.set(txhash, details)
+        return details
+
+    details = await _fetch_tx_details(txhash)
+    if details.get("status") in FINALIZED_TX_STATUSES:
+        try:
+            await _store_finalized_tx(txhash, details)
+        except Exception as e:
+            print(f"Could not persist finalized tx {txhash}: {e}", flush=True)
+        tx_details_cache.set(txhash, details)
+
+    return details
+
+
+async def _fetch_tx_details(txhash):
     url = f"{MAIN_URL}/{txhash}"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        data = response.json()
+    response = await upstream_request("cotiscan_transaction", "GET", url)
+    data = response.json()
+
+    return {
+        "transaction_hash": data.get("hash"),
+        "status": data.get("status"),  # usually "ok" for success
+        "from_address": data.get("from", {}).get("hash"),
+        "to_address": data.get("to", {}).get("hash"),
+        "contract_name": data.get("to", {}).get("name"),
+        "value_sent": data.get("value"),  # usually in wei
+        "timestamp": data.get("timestamp"),
+        "gas_used": data.get("gas_used"),
+        "transaction_fee": data.get("fee", {}).get("value")
+    }
 
+
+
+RPC_URL = os.getenv("COTI_RPC", "https://mainnet.coti.io/rpc")
+RPC_BATCH_SIZE = int(os.getenv("RPC_BATCH_SIZE", 50))
+
+
+async def rpc_batch(calls):
+    """
+    Send `calls` ([(method, params), ...]) as one JSON-RPC batch request and
+    return the results in the same order. Calls answered with an error come
+    back as None.
+    """
+    if not calls:
+        return []
+    payload = [
+        {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+        for i, (method, params) in enumerate(calls)
+    ]
+    response = await upstream_request("coti_rpc_batch", "POST", RPC_URL, json=payload)
+    replies = response.json()
+    if not isinstance(replies, list):
+        # Some nodes answer a rejected batch with a single error object
+        raise ValueError(f"RPC batch rejected: {replies}")
+
+    by_id = {reply.get("id"): reply for reply in replies}
+    results = []
+    for i, (method, params) in enumerate(calls):
+        reply = by_id.get(i, {})
+        if "error" in reply:
+            print(f"RPC {method} {params} failed: {reply['error']}", flush=True)
+        results.append(reply.get("result"))
+    return results
+
+
+def _receipt_status(receipt):
+    """Map a receipt to the explorer's status vocabulary: ok, error, or None (not mined)."""
+    if receipt is None:
+        return None
+    if int(receipt.get("status") or "0x0", 16) != 1:
+        return "error"
+    return "ok"
+
+
+async def get_rpc_tx_details(txhashes):
+    """
+    Resolve many transactions against the COTI RPC with batched
+    eth_getTransactionReceipt calls, RPC_BATCH_SIZE hashes per HTTP request.
+
+    Returns {txhash: details} shaped like get_important_tx_details, plus the
+    receipt logs. value_sent is left empty: it is read from the will event,
+    see will_event_details.
+    """
+    details = {}
+    txhashes = list(dict.fromkeys(txhashes))
+
+    for start in range(0, len(txhashes), RPC_BATCH_SIZE):
+        chunk = txhashes[start:start + RPC_BATCH_SIZE]
+        results = await rpc_batch([("eth_getTransactionReceipt", [h]) for h in chunk])
+        receipts = dict(zip(chunk, results))
+
+        for txhash in chunk:
+            receipt = receipts.get(txhash)
+            details[txhash] = {
+                "transaction_hash": txhash,
+                "status": _receipt_status(receipt),
+                "from_address": receipt.get("from") if receipt else None,
+                "to_address": receipt.get("to") if receipt else None,
+                "value_sent": None,
+                "gas_used": str(int(receipt["gasUsed"], 16)) if receipt and receipt.get("gasUsed") else None,
+                "logs": receipt.get("logs", []) if receipt else [],
+            }
+
+    return details
+
+
+def event_topic(signature: str):
+    """topic0 of an event, e.g. event_topic("WillDistributed(address,uint256,address,uint256)")."""
+    return "0x" + keccak(text=signature).hex()
+
+
+def find_will_event(logs, contract_address, topic, owner, will_id):
+    """
+    The first log in `logs` emitted by `contract_address` for event `topic`
+    on `owner`'s will `will_id`, or None. Will events index the owner and the
+    will id (topics 1 and 2), will ids are only unique per owner. The amount,
+    when the event has one, is the first data word.
+    """
+    if not contract_address or will_id is None:
+        return None
+
+    for log in logs or ():
+        topics = log.get("topics") or []
+        if log.get("removed") or len(topics) < 3:
+            continue
+        if (log.get("address") or "").lower() != contract_address.lower() or topics[0].lower() != topic:
+            continue
+        if int(topics[2], 16) != int(will_id):
+            continue
+        log_owner = "0x" + topics[1][-40:]
+        if owner and log_owner.lower() != owner.lower():
+            continue
+
+        data = (log.get("data") or "0x")[2:]
         return {
-            "transaction_hash": data.get("hash"),
-            "status": data.get("status"),  # usually "ok" for success
-            "from_address": data.get("from", {}).get("hash"),
-            "to_address": data.get("to", {}).get("hash"),
-            "contract_name": data.get("to", {}).get("name"),
-            "value_sent": data.get("value"),  # usually in wei
-            "timestamp": data.get("timestamp"),
-            "gas_used": data.get("gas_used"),
-            "transaction_fee": data.get("fee", {}).get("value")
+            "owner": log_owner,
+            "will_id": int(will_id),
+            "amount": int(data[:64], 16) if len(data) >= 64 else None,
         }
+    return None
 
 
+def will_event_details(details, contract_address, topic, owner, will_id):
+    """
+    Narrow RPC `details` to one will: a successful transaction without the
+    matching will event reads as "unmatched" (the caller decides whether to
+    retry), and value_sent is the amount the event carries.
+    """
+    if details.get("status") != "ok":
+        return details
 
-URL= "https://mainnet.cotiscan.io/api/v2/addresses"
+    event = find_will_event(details.get("logs"), contract_address, topic, owner, will_id)
+    if event is None:
+        return {**details, "status": "unmatched"}
+    return {**details, "value_sent": str(event["amount"]) if event["amount"] is not None else None}
 
 
-async def get_latest_transaction(wallet_address):
+URL = os.getenv("COTI_ADDRESSES_URL", "https://mainnet.cotiscan.io/api/v2/addresses")
+
+# Inactivity is measured in weeks and months, a score a few minutes old is fine
+WALLET_ACTIVITY_CACHE_TTL = float(os.getenv("WALLET_ACTIVITY_CACHE_TTL", 300))
+WALLET_ACTIVITY_CACHE_SIZE = int(os.getenv("WALLET_ACTIVITY_CACHE_SIZE", 10000))
+
+wallet_activity_cache = TTLCache(
+    maxsize=WALLET_ACTIVITY_CACHE_SIZE,
+    ttl=WALLET_ACTIVITY_CACHE_TTL,
+    name="wallet_activity",
+)
+
+
+def inactivity_score(timestamp_str, now=None):
+    """
+    Reduce the timestamp of a wallet's latest transaction to an inactivity
+    score, expressed in (approximate) months.
+    """
+    tx_time = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00")).replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+
+    diff_days = (now - tx_time).days
+    diff_months = diff_days / 30.44  # approx months
+
+    if diff_days <= 7:  # ≤ 1 week
+        score = 0.25
+    elif diff_days <= 30:  # > 1 week ≤ 1 month
+        score = 1
+    elif diff_days <= 60:  # > 1 month ≤ 2 months
+        score = 2
+    else:  # > 2 months
+        score = round(diff_months)
+
+    return score
+
+
+async def _fetch_latest_transaction_score(wallet_address):
     url = f"{URL}/{wallet_address}/transactions"
     print(url, flush=True)
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch transactions")
-        data = response.json()
-        items = data.get("items", [])
-        if not items:
-            raise HTTPException(status_code=404, detail="No transactions found for this address")
-        
-        latest_tx = items[0]  # first item is the latest
-        timestamp_str= latest_tx.get("timestamp")
-
-        tx_time = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00")).replace(tzinfo=timezone.utc)
-        now = datetime.now(timezone.utc)
-
-        diff_days = (now - tx_time).days
-        print("diff_day:", diff_days)
-        diff_months = diff_days / 30.44  # approx months
-        print("diff_m:", diff_months)
-
-        if diff_days <= 7:  # ≤ 1 week
-            score = 0.25
-        elif diff_days <= 30:  # > 1 week ≤ 1 month
-            score = 1
-        elif diff_days <= 60:  # > 1 month ≤ 2 months
-            score = 2
-        else:  # > 2 months
-            score = round(diff_months)
-
-
-        return score
\ No newline at end of file
+    response = await upstream_request("cotiscan_address_transactions", "GET", url)
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch transactions")
+    data = response.json()
+    items = data.get("items", [])
+    if not items:
+        raise HTTPException(status_code=404, detail="No transactions found for this address")
+    
+    latest_tx = items[0]  # first item is the latest
+    score = inactivity_score(latest_tx.get("timestamp"))
+    print("inactivity score:", wallet_address, score)
+
+    return score
+
+
+async def get_latest_transaction(wallet_address):
+    """
+    Inactivity score of `wallet_address`, served from the wallet activity cache.
+    Concurrent callers for the same wallet share a single explorer request.
+    """
+    key = wallet_address.lower()
+    return await wallet_activity_cache.get_or_load(
+        key, lambda: _fetch_latest_transaction_score(wallet_address)
+    )